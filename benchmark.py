@@ -0,0 +1,295 @@
+# ###### Benchmarks ######
+#
+# This file times the operations of the binary search tree and the red-black tree, and the partitioning modes and parallel sort of quicksort, and the set operations of the red-black tree
+#
+# Each benchmark builds a tree out of randomly generated keys and reports the average time per operation in nanoseconds
+#
+# ###### Examples ######
+#
+# Example 1: Compare every binary search tree operation with its recursive version for 100,000 and 1,000,000 keys
+#
+# % python benchmark.py -b operations -s 1e5 1e6
+#
+# Example 2: Compare search_many() with a loop of search() calls for batches of 1,000 to 1,000,000 probes against trees of 1,000,000 keys
+#
+# % python benchmark.py -b search_many -k 1e6 -s 1e3 1e4 1e5 1e6
+#
+# Example 3: Compare the concurrent red-black tree with a red-black tree behind a global lock, for 4 threads and 1%, 10% and 50% writes against 100,000 keys
+#
+# % python benchmark.py -b concurrency -k 1e5 -w 4 --writes 0.01 0.1 0.5
+#
+# Example 4: Compare two-way and three-way partitioning on lists of 100,000 and 1,000,000 keys with 2, 10, 300 and 1,000,000 distinct values
+#
+# % python benchmark.py -b sort -s 1e5 1e6 -c 2 10 300 1e6
+#
+# Example 5: Compare the parallel sort with 1, 2, 4, 8, 16 and 32 workers on lists of 10,000,000 keys
+#
+# % python benchmark.py -b parallel -s 1e7 -w 32
+#
+# Example 6: Compare union() with inserting the values of the smaller tree one at a time, for deltas of 100 to 400,000 keys merged into trees of 400,000 keys
+#
+# % python benchmark.py -b union -k 4e5 -s 1e2 1e3 1e4 1e5 4e5
+
+import random
+import time
+import threading
+import argparse
+import bst
+import redblacktree
+import concurrentredblacktree
+import quicksort
+import parallelsort
+
+def measure(function, count):
+    start_time = time.perf_counter_ns()
+    function()
+    return (time.perf_counter_ns() - start_time) / max(count, 1)
+
+# ###### Recursive reference ######
+#
+# These are the recursive versions of the binary search tree operations, as bst.py had them before they were made iterative
+# benchmark_operations() runs them on a tree of their own, built out of the same keys, to show how much the iterative versions gain
+
+def recursive_insert(node, value):
+    if node is None:
+        return bst.Node(value)
+    elif value == node.value:
+        node.frequency += 1
+    elif value < node.value:
+        node.left = recursive_insert(node.left, value)
+    else:
+        node.right = recursive_insert(node.right, value)
+    return node
+
+def recursive_search(node, value):
+    if node is None:
+        return False
+    elif value == node.value:
+        return True
+    elif value < node.value:
+        return recursive_search(node.left, value)
+    else:
+        return recursive_search(node.right, value)
+
+def recursive_delete(node, value):
+    if node is None:
+        return None
+    elif value < node.value:
+        node.left = recursive_delete(node.left, value)
+    elif value > node.value:
+        node.right = recursive_delete(node.right, value)
+    else:
+        if node.left is None:
+            return node.right
+        if node.right is None:
+            return node.left
+        successor = node.right
+        while successor.left is not None:
+            successor = successor.left
+        node.value, node.frequency = successor.value, successor.frequency
+        node.right = recursive_delete(node.right, successor.value)
+    return node
+
+def recursive_tolist(node, arr):
+    if node is None:
+        return arr
+    recursive_tolist(node.left, arr)
+    for _ in range(node.frequency):
+        arr.append(node.value)
+    recursive_tolist(node.right, arr)
+    return arr
+
+def recursive_height(node):
+    if node is None:
+        return 0
+    return 1 + max(recursive_height(node.left), recursive_height(node.right))
+
+def recursive_size(node):
+    if node is None:
+        return (0, 0)
+    left_nodes, left_values = recursive_size(node.left)
+    right_nodes, right_values = recursive_size(node.right)
+    return (1 + left_nodes + right_nodes, node.frequency + left_values + right_values)
+
+def recursive_str(node):
+    if node is None:
+        return ''
+    elif node.left is None and node.right is None:
+        return f'{node.value}'
+    elif node.right is None:
+        return f'{node.value}({recursive_str(node.left)})'
+    elif node.left is None:
+        return f'{node.value}({recursive_str(node.right)})'
+    return f'{node.value}({recursive_str(node.left)})({recursive_str(node.right)})'
+
+# The speedup is the recursive time divided by the iterative time, so a speedup above 1 means the iterative version is faster
+def benchmark_operations(sizes):
+    for size in sizes:
+        keys = random.sample(range(10 * size), size)
+        probes = random.sample(keys, min(size, 100000))
+        tree = bst.BinarySearchTree()
+        reference = [None]
+        def insert_all():
+            root = reference[0]
+            for key in keys:
+                root = recursive_insert(root, key)
+            reference[0] = root
+        def delete_all():
+            root = reference[0]
+            for key in probes:
+                root = recursive_delete(root, key)
+            reference[0] = root
+        results = []
+        results.append(('insert', measure(lambda: [tree.insert(key) for key in keys], size), measure(insert_all, size)))
+        results.append(('search', measure(lambda: [tree.search(key) for key in probes], len(probes)), measure(lambda: [recursive_search(reference[0], key) for key in probes], len(probes))))
+        results.append(('tolist', measure(tree.tolist, size), measure(lambda: recursive_tolist(reference[0], []), size)))
+        results.append(('calculate_height', measure(tree.calculate_height, size), measure(lambda: recursive_height(reference[0]), size)))
+        results.append(('calculate_size', measure(tree.calculate_size, size), measure(lambda: recursive_size(reference[0]), size)))
+        results.append(('str', measure(tree.str, size), measure(lambda: recursive_str(reference[0]), size)))
+        results.append(('delete', measure(lambda: [tree.delete(key) for key in probes], len(probes)), measure(delete_all, len(probes))))
+        print(f'Binary search tree with {size} keys')
+        print('------------------------------')
+        for name, iterative, recursive in results:
+            print(f'{name:<20} iterative {iterative:>10.1f} ns   recursive {recursive:>10.1f} ns per key   speedup {recursive / iterative:.2f}x')
+        print('')
+
+def benchmark_search_many(sizes, key_count):
+    keys = random.sample(range(10 * key_count), key_count)
+    trees = [('Binary search tree', bst.BinarySearchTree(list(keys))), ('Red-black tree', redblacktree.RedBlackTree(keys))]
+    for name, tree in trees:
+        print(f'{name} with {key_count} keys')
+        print('------------------------------')
+        for size in sizes:
+            probes = [random.randrange(10 * key_count) for _ in range(size)]
+            loop = measure(lambda: [tree.search(probe) for probe in probes], size)
+            batch = measure(lambda: tree.search_many(probes), size)
+            print(f'{size:>10} probes   search {loop:>8.1f} ns   search_many {batch:>8.1f} ns   speedup {loop / batch:.2f}x')
+        print('')
+
+# Every thread gets its own list of operations, where a write is an insert or a delete of a random key and a read is a search
+def concurrency_operations(key_count, operation_count, write_ratio):
+    operations = []
+    for _ in range(operation_count):
+        key = random.randrange(10 * key_count)
+        if random.random() < write_ratio:
+            operations.append(('insert' if random.random() < 0.5 else 'delete', key))
+        else:
+            operations.append(('search', key))
+    return operations
+
+def run_threads(worker, workloads):
+    threads = [threading.Thread(target=worker, args=(operations,)) for operations in workloads]
+    start_time = time.perf_counter_ns()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter_ns() - start_time
+
+def benchmark_concurrency(key_count, operation_count, thread_count, write_ratios):
+    keys = random.sample(range(10 * key_count), key_count)
+    print(f'{thread_count} threads, {operation_count} operations per thread, {key_count} keys')
+    print('------------------------------')
+    for write_ratio in write_ratios:
+        workloads = [concurrency_operations(key_count, operation_count, write_ratio) for _ in range(thread_count)]
+        locked_tree = redblacktree.RedBlackTree(list(keys))
+        lock = threading.Lock()
+        def locked_worker(operations):
+            for operation, key in operations:
+                with lock:
+                    if operation == 'search':
+                        locked_tree.search(key)
+                    elif operation == 'insert':
+                        locked_tree.insert(key)
+                    else:
+                        locked_tree.delete(key)
+        concurrent_tree = concurrentredblacktree.ConcurrentRedBlackTree(list(keys))
+        def concurrent_worker(operations):
+            for operation, key in operations:
+                if operation == 'search':
+                    concurrent_tree.search(key)
+                elif operation == 'insert':
+                    concurrent_tree.insert(key)
+                else:
+                    concurrent_tree.delete(key)
+        total = thread_count * operation_count
+        locked = total / (run_threads(locked_worker, workloads) / 1e9)
+        concurrent = total / (run_threads(concurrent_worker, workloads) / 1e9)
+        print(f'{write_ratio:>6.0%} writes   global lock {locked:>10.0f} ops/s   snapshots {concurrent:>10.0f} ops/s   speedup {concurrent / locked:.2f}x')
+    print('')
+
+# Every mode sorts a copy of the same list with the Python backend, and the NumPy backend (if NumPy is installed) and sorted() are included for reference
+def benchmark_sort(sizes, cardinalities):
+    for size in sizes:
+        print(f'Quicksort of {size} keys')
+        print('------------------------------')
+        for cardinality in cardinalities:
+            keys = [random.randrange(cardinality) for _ in range(size)]
+            results = []
+            for partitioning in quicksort.PARTITIONS:
+                arr = list(keys)
+                results.append((partitioning, measure(lambda: quicksort.quicksort(arr, 0, size - 1, partitioning, 'python'), size)))
+            if quicksort.numpy is not None:
+                arr = list(keys)
+                results.append(('numpy', measure(lambda: quicksort.quicksort(arr, 0, size - 1, backend='numpy'), size)))
+            arr = list(keys)
+            results.append(('sorted', measure(lambda: arr.sort(), size)))
+            timings = '   '.join(f'{name} {elapsed:>7.1f} ns' for name, elapsed in results)
+            print(f'{cardinality:>10} distinct   {timings}')
+        print('')
+
+# We double the number of workers up to the maximum, and the speedup is relative to quicksort in a single process
+def benchmark_parallel(sizes, max_workers):
+    for size in sizes:
+        keys = [random.randrange(10 * size) for _ in range(size)]
+        arr = list(keys)
+        baseline = measure(lambda: quicksort.quicksort(arr, 0, size - 1), size)
+        print(f'Parallel sort of {size} keys')
+        print('------------------------------')
+        print(f'{"quicksort":>10}   {baseline:>8.1f} ns per key')
+        for workers in [2 ** i for i in range(1, max_workers.bit_length()) if 2 ** i < max_workers] + [max_workers]:
+            arr = list(keys)
+            elapsed = measure(lambda: parallelsort.parallel_quicksort(arr, workers), size)
+            print(f'{workers:>2} workers   {elapsed:>8.1f} ns per key   speedup {baseline / elapsed:.2f}x')
+        print('')
+
+# Both sides start from the same pair of trees, and the times cover only the merge, not building the trees
+def benchmark_union(sizes, key_count):
+    keys = [random.randrange(10 * key_count) for _ in range(key_count)]
+    print(f'Union of red-black trees with {key_count} keys')
+    print('------------------------------')
+    for size in sizes:
+        delta = [random.randrange(10 * key_count) for _ in range(size)]
+        base, other = redblacktree.RedBlackTree(keys), redblacktree.RedBlackTree(delta)
+        loop = measure(lambda: [base.insert(value) for value in other.to_list()], size)
+        base, other = redblacktree.RedBlackTree(keys), redblacktree.RedBlackTree(delta)
+        strategy = base.set_strategy(min(base.root.node_count, other.root.node_count), max(base.root.node_count, other.root.node_count))
+        union = measure(lambda: base.union(other), size)
+        print(f'{size:>10} keys   insert {loop:>8.1f} ns   union ({strategy}) {union:>8.1f} ns   speedup {loop / union:.2f}x')
+    print('')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmark.py', description='Benchmark the search trees')
+    parser.add_argument('-b', '--benchmark', choices=['operations', 'search_many', 'concurrency', 'sort', 'parallel', 'union'], default='operations')
+    parser.add_argument('-s', '--sizes', nargs='+', type=float, default=[1e5, 1e6])
+    parser.add_argument('-k', '--keys', type=float, default=1e6)
+    parser.add_argument('-w', '--threads', type=int, default=4)
+    parser.add_argument('-o', '--operations', type=float, default=1e5)
+    parser.add_argument('--writes', nargs='+', type=float, default=[0.01, 0.1, 0.5])
+    parser.add_argument('-c', '--cardinalities', nargs='+', type=float, default=[2, 10, 300, 1e6])
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    sizes = [int(size) for size in args.sizes]
+    if args.benchmark == 'operations':
+        benchmark_operations(sizes)
+    elif args.benchmark == 'search_many':
+        benchmark_search_many(sizes, int(args.keys))
+    elif args.benchmark == 'concurrency':
+        benchmark_concurrency(int(args.keys), int(args.operations), args.threads, args.writes)
+    elif args.benchmark == 'sort':
+        benchmark_sort(sizes, [int(cardinality) for cardinality in args.cardinalities])
+    elif args.benchmark == 'parallel':
+        benchmark_parallel(sizes, args.threads)
+    elif args.benchmark == 'union':
+        benchmark_union(sizes, int(args.keys))
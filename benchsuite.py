@@ -0,0 +1,253 @@
+# ###### Introduction ######
+#
+# This file compares the binary search tree, the red-black tree, a sorted list and a dictionary on the same workloads
+#
+# The sorted list is kept sorted with the bisect module, and the dictionary maps each key to its number of occurrences
+#
+# There are five workloads
+#
+# 1. insert: insert n keys into an empty structure
+# 2. search: search a structure of n keys for n keys, about half of which are present
+# 3. delete: delete half of the keys of a structure of n keys
+# 4. range: count the keys of n / 100 ranges that each hold about 100 keys
+# 5. mixed: n operations, 50% searches, 25% inserts, 20% deletes and 5% range scans
+#
+# And there are five key distributions
+#
+# 1. uniform: random keys between 0 and 10n
+# 2. sorted: the keys 0 to n - 1 in increasing order
+# 3. reversed: the keys 0 to n - 1 in decreasing order
+# 4. zipf: a few hot keys make up most of the operations (a Zipf distribution with exponent 1.1)
+# 5. dups: random keys between 0 and n / 100, so every key occurs about 100 times
+#
+# For each combination we report the operations per second, the peak memory used to build the structure (measured with tracemalloc), and the height of the trees
+#
+# The results can be written to a JSON file, and a JSON file from an earlier run can be used as a baseline
+#
+# A result that is slower or bigger than its baseline by more than the threshold is flagged as a regression, and the exit status is 1
+#
+# The dictionary has no order, so it skips the range and mixed workloads, and the plain binary search tree skips sorted and reversed keys above 2,000 keys, because it degenerates into a linked list
+#
+# ###### Examples ######
+#
+# Example 1: Run every workload for 1,000 and 100,000 keys, and save the results
+#
+# % python benchsuite.py -s 1e3 1e5 -o baseline.json
+#
+# Example 2: Run the search workload on uniform and Zipfian keys, and compare the results with the baseline
+#
+# % python benchsuite.py -s 1e3 1e5 -w search -d uniform zipf --baseline baseline.json
+
+import bisect
+import itertools
+import json
+import random
+import sys
+import time
+import tracemalloc
+import argparse
+import bst
+import redblacktree
+
+class SortedList:
+    def __init__(self, arr=None):
+        self.values = sorted(arr) if arr else []
+
+    def insert(self, value):
+        bisect.insort(self.values, value)
+
+    def search(self, value):
+        i = bisect.bisect_left(self.values, value)
+        return i < len(self.values) and self.values[i] == value
+
+    # Like the trees, we remove every occurrence of the value
+    def delete(self, value):
+        i = bisect.bisect_left(self.values, value)
+        j = bisect.bisect_right(self.values, value, i)
+        del self.values[i:j]
+
+    def range(self, lo, hi):
+        return iter(self.values[bisect.bisect_left(self.values, lo):bisect.bisect_right(self.values, hi)])
+
+class Dictionary:
+    def __init__(self, arr=None):
+        self.counts = {}
+        for value in arr or []:
+            self.insert(value)
+
+    def insert(self, value):
+        self.counts[value] = self.counts.get(value, 0) + 1
+
+    def search(self, value):
+        return value in self.counts
+
+    def delete(self, value):
+        self.counts.pop(value, None)
+
+STRUCTURES = {
+    'bst': bst.BinarySearchTree,
+    'rbt': redblacktree.RedBlackTree,
+    'list': SortedList,
+    'dict': Dictionary,
+}
+
+WORKLOADS = ['insert', 'search', 'delete', 'range', 'mixed']
+
+DISTRIBUTIONS = ['uniform', 'sorted', 'reversed', 'zipf', 'dups']
+
+# The trees rebuild the plain binary search tree from sorted keys, but inserting sorted keys one at a time makes it a linked list
+DEGENERATE_LIMIT = 2000
+
+def generate_keys(distribution, size, count):
+    if distribution == 'uniform':
+        return [random.randrange(10 * size) for _ in range(count)]
+    if distribution == 'sorted':
+        return [i % size for i in range(count)]
+    if distribution == 'reversed':
+        return [size - 1 - i % size for i in range(count)]
+    if distribution == 'zipf':
+        # We spread the ranks over the key space with a multiplicative hash, so the hot keys are not neighbours
+        weights = list(itertools.accumulate(1 / rank ** 1.1 for rank in range(1, size + 1)))
+        ranks = random.choices(range(size), cum_weights=weights, k=count)
+        return [rank * 2654435761 % (10 * size) for rank in ranks]
+    if distribution == 'dups':
+        return [random.randrange(size // 100 or 1) for _ in range(count)]
+    raise ValueError(f'Unknown distribution {distribution}')
+
+def height_of(structure):
+    if isinstance(structure, bst.BinarySearchTree):
+        return structure.calculate_height()
+    if isinstance(structure, redblacktree.RedBlackTree):
+        return structure.height()
+    return None
+
+def count_range(structure, lo, hi):
+    count = 0
+    for _ in structure.range(lo, hi):
+        count += 1
+    return count
+
+# We build the starting structure by inserting the keys in order, so the plain binary search tree takes the shape that the distribution gives it
+def build(name, keys):
+    if name == 'bst' or name == 'rbt':
+        structure = STRUCTURES[name]()
+        for key in keys:
+            structure.insert(key)
+        return structure
+    return STRUCTURES[name](keys)
+
+# We return the operations of a workload as a list of (operation, arguments) pairs, which is generated before the clock starts
+def generate_operations(workload, distribution, size, keys):
+    if workload == 'insert':
+        return [('insert', (key,)) for key in keys]
+    if workload == 'search':
+        probes = generate_keys(distribution, size, size)
+        return [('search', (probe,)) for probe in probes]
+    if workload == 'delete':
+        return [('delete', (key,)) for key in random.sample(keys, len(keys) // 2)]
+    span = max(keys) - min(keys) + 1
+    width = span * 100 // size or 1
+    if workload == 'range':
+        return [('range', (lo, lo + width)) for lo in generate_keys(distribution, size, size // 100 or 1)]
+    if workload == 'mixed':
+        operations = []
+        for kind, key in zip(random.choices(['search', 'insert', 'delete', 'range'], [50, 25, 20, 5], k=size), generate_keys(distribution, size, size)):
+            operations.append((kind, (key, key + width) if kind == 'range' else (key,)))
+        return operations
+    raise ValueError(f'Unknown workload {workload}')
+
+def run(name, workload, distribution, size, measure_memory):
+    result = {'structure': name, 'workload': workload, 'distribution': distribution, 'size': size}
+    if name == 'dict' and workload in ('range', 'mixed'):
+        result['skipped'] = 'a dictionary has no order'
+        return result
+    if name == 'bst' and distribution in ('sorted', 'reversed') and size > DEGENERATE_LIMIT:
+        result['skipped'] = 'the tree degenerates into a linked list'
+        return result
+    keys = generate_keys(distribution, size, size)
+    if measure_memory:
+        tracemalloc.start()
+        build(name, keys)
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    structure = build(name, [] if workload == 'insert' else keys)
+    operations = generate_operations(workload, distribution, size, keys)
+    functions = {
+        'insert': structure.insert,
+        'search': structure.search,
+        'delete': structure.delete,
+        'range': lambda lo, hi: count_range(structure, lo, hi),
+    }
+    start_time = time.perf_counter_ns()
+    for operation, arguments in operations:
+        functions[operation](*arguments)
+    elapsed = time.perf_counter_ns() - start_time
+    result['operations'] = len(operations)
+    result['seconds'] = elapsed / 1e9
+    result['ops_per_sec'] = len(operations) / (elapsed / 1e9 or 1)
+    result['height'] = height_of(structure)
+    return result
+
+def result_key(result):
+    return (result['structure'], result['workload'], result['distribution'], result['size'])
+
+# We return a list of messages, one for each result that is worse than its baseline by more than the threshold
+def compare(results, baseline, threshold):
+    baseline = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None or 'skipped' in result or 'skipped' in old:
+            continue
+        label = '/'.join(str(part) for part in result_key(result))
+        if result['ops_per_sec'] < old['ops_per_sec'] * (1 - threshold):
+            regressions.append(f'{label}: {result["ops_per_sec"]:.0f} ops/s, baseline {old["ops_per_sec"]:.0f} ops/s')
+        if result.get('peak_memory') and old.get('peak_memory') and result['peak_memory'] > old['peak_memory'] * (1 + threshold):
+            regressions.append(f'{label}: {result["peak_memory"]} bytes, baseline {old["peak_memory"]} bytes')
+    return regressions
+
+def report(result):
+    label = f'{result["structure"]:<5} {result["workload"]:<7} {result["distribution"]:<9} {result["size"]:>9}'
+    if 'skipped' in result:
+        print(f'{label}   skipped ({result["skipped"]})')
+        return
+    memory = f'{result["peak_memory"] / 2 ** 20:>9.1f} MB' if 'peak_memory' in result else ''
+    height = f'   height {result["height"]}' if result['height'] is not None else ''
+    print(f'{label} {result["ops_per_sec"]:>12.0f} ops/s{memory}{height}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchsuite.py', description='Compare the search trees with a sorted list and a dictionary')
+    parser.add_argument('-s', '--sizes', nargs='+', type=float, default=[1e3, 1e4, 1e5])
+    parser.add_argument('-S', '--structures', nargs='+', choices=list(STRUCTURES), default=list(STRUCTURES))
+    parser.add_argument('-w', '--workloads', nargs='+', choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument('-d', '--distributions', nargs='+', choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    parser.add_argument('-o', '--outputfile', type=str)
+    parser.add_argument('--baseline', type=str)
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    results = []
+    for size in [int(size) for size in args.sizes]:
+        for distribution in args.distributions:
+            for workload in args.workloads:
+                for name in args.structures:
+                    random.seed(args.seed)
+                    result = run(name, workload, distribution, size, not args.no_memory)
+                    report(result)
+                    results.append(result)
+    if args.outputfile:
+        with open(args.outputfile, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        print('')
+        print('Regressions')
+        print('------------------------------')
+        for regression in regressions:
+            print(regression)
+        if not regressions:
+            print('None')
+        sys.exit(1 if regressions else 0)
@@ -220,157 +220,711 @@
 #
 # % cat tree.txt
 # 3(1(2))(4(5))
+#
+# Example 5: Save a binary search tree to a snapshot file and load it back
+#
+# % python bst.py -r -s 1e6 -max 1e9 -d tree.snap
+# % python bst.py -l tree.snap -t 42
 
+import bisect
+import collections
+import math
 import random
 import time
 import argparse
-import ast
+import dataio
+import snapshot
+import staticindex
 
 class BinarySearchTree:
-    def __init__(self, arr=None):
+    # If alpha is given, the tree balances itself as a scapegoat tree, and no node is allowed to have a subtree with more than alpha of its nodes for long
+    # An alpha close to 0.5 keeps the tree close to perfectly balanced, and an alpha close to 1 rebuilds less often
+    # If cache_size is given, search() keeps the nodes it found most recently in a cache of that many values
+    # The nodes have no parent pointers, so unlike the red-black tree there is no finger search, and a miss always starts from the root
+    # If tombstone_ratio is given, delete() only marks the node of a value as deleted (a tombstone), and the tree is rebuilt without its tombstones once they make up more than that fraction of the nodes
+    def __init__(self, arr=None, alpha=None, cache_size=0, tombstone_ratio=None):
+        if alpha is not None and not 0.5 <= alpha < 1:
+            raise ValueError('alpha must be at least 0.5 and less than 1')
+        self.alpha = alpha
+        self.tombstone_ratio = tombstone_ratio
+        self.tombstones = 0
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict() if cache_size else None
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.root = None
         self.node_count = 0
         self.value_count = 0
         self.height = 0
+        # The largest number of nodes since the last full rebuild, which tells a scapegoat tree when deletes have made it too sparse
+        self.max_node_count = 0
         if arr:
-            arr.sort()
-            self._balance(arr, 0, len(arr) - 1)
+            self.bulk_load(arr)
+
+    # We collapse each run of equal values into a single node and link the nodes bottom-up, which builds a balanced tree in linear time without calling insert()
+    def bulk_load(self, arr, presorted=False):
+        if not presorted:
+            arr = sorted(arr)
+        values = []
+        counts = []
+        for value in arr:
+            if values and value == values[-1]:
+                counts[-1] += 1
+            else:
+                values.append(value)
+                counts.append(1)
+        self._load(values, counts)
+
+    # We build the tree from (value, record) pairs, where the records of equal values are kept together in one node
+    def load_records(self, pairs, presorted=False):
+        if not presorted:
+            pairs = sorted(pairs, key=lambda pair: pair[0])
+        values = []
+        counts = []
+        records = []
+        for value, record in pairs:
+            if values and value == values[-1]:
+                counts[-1] += 1
+                records[-1].append(record)
+            else:
+                values.append(value)
+                counts.append(1)
+                records.append([record])
+        self._load(values, counts, records)
+
+    def _load(self, values, counts, records=None):
+        self.clear_cache()
+        self.tombstones = 0
+        self.root = self._build(values, counts, records, 0, len(values) - 1)
+        self.node_count = len(values)
+        self.max_node_count = len(values)
+        self.value_count = sum(counts)
+        self.height = len(values).bit_length()
 
-    def _balance(self, arr, start, end):
+    def _build(self, values, counts, records, start, end):
         if start > end:
-            return
+            return None
         mid = (start + end) // 2
-        self.insert(arr[mid])
-        self._balance(arr, start, mid - 1)
-        self._balance(arr, mid + 1, end)
+        node = Node(values[mid])
+        node.frequency = counts[mid]
+        if records is not None:
+            node.records = records[mid]
+        node.left = self._build(values, counts, records, start, mid - 1)
+        node.right = self._build(values, counts, records, mid + 1, end)
+        node.update()
+        return node
 
+    # We restructure the existing nodes in place, so the frequencies and records stay on their nodes and no memory is allocated
     def balance(self):
-        arr = self.tolist()
-        self.root = None
-        self.node_count = 0
-        self.value_count = 0
-        self.height = 0
-        self._balance(arr, 0, len(arr) - 1)
-
-    def _insert(self, node, value):
-        if node is None:
-            node = Node(value)
-        elif value == node.value:
-            node.frequency += 1
-        elif value < node.value:
-            node.left = self._insert(node.left, value)
-        else:
-            node.right = self._insert(node.right, value)
-        return node
+        if self.root is None:
+            return
+        if self.tombstones:
+            self.compact()
+            return
+        self.root = self.rebuild(self.root)
+        self.node_count = self.root.node_count
+        self.value_count = self.root.value_count
+        self.height = self.node_count.bit_length()
+        self.max_node_count = self.node_count
 
-    def insert(self, value):
-        self.root = self._insert(self.root, value)
+    # A record can be stored along with the value, and it is chained to the records of equal values in the same node
+    def insert(self, value, record=None):
+        node = Node(value)
+        if record is not None:
+            node.records = [record]
+        if self.root is None:
+            self.root = node
+            self.max_node_count = self.max_node_count or 1
+            return
+        path = []
+        current = self.root
+        while True:
+            path.append(current)
+            if value == current.value:
+                if current.frequency == 0:
+                    self.tombstones -= 1
+                current.frequency += 1
+                if record is not None:
+                    if current.records is None:
+                        current.records = []
+                    current.records.append(record)
+                node = None
+                break
+            elif value < current.value:
+                if current.left is None:
+                    current.left = node
+                    break
+                current = current.left
+            else:
+                if current.right is None:
+                    current.right = node
+                    break
+                current = current.right
+        for ancestor in path:
+            ancestor.value_count += 1
+            if node is not None:
+                ancestor.node_count += 1
+        if self.alpha is not None and node is not None:
+            node_count = self.root.node_count
+            if node_count > self.max_node_count:
+                self.max_node_count = node_count
+            # The new node is at depth len(path), and a scapegoat tree keeps every depth within log base 1/alpha of the number of nodes
+            if len(path) > math.log(node_count) / -math.log(self.alpha):
+                self.rebuild_scapegoat(path, node)
 
-    def _search(self, node, value):
-        if node is None:
-            return False
-        elif value == node.value:
-            return True
-        elif value < node.value:
-            return self._search(node.left, value)
-        else:
-            return self._search(node.right, value)
+    # We walk up from the new node to the first ancestor that has a child with more than alpha of its nodes (the scapegoat), and rebuild the scapegoat's subtree
+    # Such an ancestor always exists when the new node is too deep
+    def rebuild_scapegoat(self, path, node):
+        child = node
+        for i in range(len(path) - 1, -1, -1):
+            ancestor = path[i]
+            if child.node_count > self.alpha * ancestor.node_count:
+                subtree = self.rebuild(ancestor)
+                if i == 0:
+                    self.root = subtree
+                elif path[i - 1].left is ancestor:
+                    path[i - 1].left = subtree
+                else:
+                    path[i - 1].right = subtree
+                return
+            child = ancestor
+
+    # We turn a subtree into a balanced subtree with the Day-Stout-Warren algorithm, which takes linear time and a constant amount of memory
+    # First we rotate the subtree into a vine, a linked list that runs down the right children in increasing order
+    # Then we compress the vine into a balanced tree with a few passes of left rotations
+    # A dummy node above the subtree acts as its parent, so the rotations never need to special-case the top of the subtree
+    def rebuild(self, node):
+        node_count, value_count = node.node_count, node.value_count
+        dummy = Node(None)
+        dummy.right = node
+        self.tree_to_vine(dummy)
+        # Each node of the vine holds itself and every node after it, so we can set the counts from the top down
+        current = dummy.right
+        while current is not None:
+            current.node_count = node_count
+            current.value_count = value_count
+            node_count -= 1
+            value_count -= current.frequency
+            current = current.right
+        self.vine_to_tree(dummy, dummy.right.node_count)
+        return dummy.right
+
+    def tree_to_vine(self, dummy):
+        tail = dummy
+        rest = tail.right
+        while rest is not None:
+            if rest.left is None:
+                tail = rest
+                rest = rest.right
+            else:
+                # A right rotation moves the left child up into the vine
+                child = rest.left
+                rest.left = child.right
+                child.right = rest
+                rest = child
+                tail.right = child
+
+    # The first pass leaves the extra nodes of the bottom level as leaves, and every pass after that halves the length of the vine
+    def vine_to_tree(self, dummy, node_count):
+        leaves = node_count + 1 - (1 << ((node_count + 1).bit_length() - 1))
+        self.compress(dummy, leaves)
+        size = node_count - leaves
+        while size > 1:
+            size //= 2
+            self.compress(dummy, size)
+
+    # Every other node of the vine is rotated down to be the left child of the node after it
+    # The node that moves up into the vine covers exactly what the rotated node covered, so it takes over its counts
+    def compress(self, dummy, count):
+        scanner = dummy
+        for _ in range(count):
+            child = scanner.right
+            node_count, value_count = child.node_count, child.value_count
+            scanner.right = child.right
+            scanner = scanner.right
+            child.right = scanner.left
+            scanner.left = child
+            child.update()
+            scanner.node_count = node_count
+            scanner.value_count = value_count
 
     def search(self, value):
-        return self._search(self.root, value)
+        if self.cache is not None:
+            return self.search_node(value) is not None
+        current = self.root
+        while current is not None:
+            if value == current.value:
+                return current.frequency > 0
+            elif value < current.value:
+                current = current.left
+            else:
+                current = current.right
+        return False
+
+    def search_node(self, value):
+        cache = self.cache
+        if cache is not None:
+            node = cache.get(value)
+            if node is not None:
+                cache.move_to_end(value)
+                self.cache_hits += 1
+                return node
+            self.cache_misses += 1
+            node = self._search_node(value)
+            if node is not None:
+                cache[value] = node
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+            return node
+        return self._search_node(value)
+
+    # Rotations and rebuilds relink the nodes but never move a value to another node, so only delete() and bulk loading have to touch the cache
+    def forget(self, value):
+        if self.cache is not None:
+            self.cache.pop(value, None)
+
+    def clear_cache(self):
+        if self.cache is not None:
+            self.cache.clear()
+
+    # We return the number of cache hits and misses, and the fraction of searches that hit the cache
+    def cache_stats(self):
+        total = self.cache_hits + self.cache_misses
+        return {'hits': self.cache_hits, 'misses': self.cache_misses, 'hit_rate': self.cache_hits / total if total else 0.0}
+
+    def _search_node(self, value):
+        current = self.root
+        while current is not None:
+            if value == current.value:
+                return current if current.frequency else None
+            elif value < current.value:
+                current = current.left
+            else:
+                current = current.right
+        return None
+
+    # We answer a batch of searches in one walk down the tree
+    # The probes are sorted once, and each node splits its range of probes into those that go left and those that go right, so probes that share a path from the root share the work of walking it
+    def _search_many(self, values):
+        values = list(values)
+        order = sorted(range(len(values)), key=values.__getitem__)
+        probes = [values[i] for i in order]
+        results = [None] * len(values)
+        stack = [(self.root, 0, len(probes))] if self.root is not None and probes else []
+        while stack:
+            node, start, end = stack.pop()
+            # Once only a few probes share this subtree, it is cheaper to finish each of them with an ordinary search
+            if end - start <= 8:
+                for i in range(start, end):
+                    value = probes[i]
+                    current = node
+                    while current is not None and value != current.value:
+                        if value < current.value:
+                            current = current.left
+                        else:
+                            current = current.right
+                    results[order[i]] = current
+                continue
+            lo = bisect.bisect_left(probes, node.value, start, end)
+            hi = bisect.bisect_right(probes, node.value, lo, end)
+            for i in range(lo, hi):
+                results[order[i]] = node
+            if lo > start and node.left is not None:
+                stack.append((node.left, start, lo))
+            if hi < end and node.right is not None:
+                stack.append((node.right, hi, end))
+        if self.tombstones:
+            results = [node if node is not None and node.frequency else None for node in results]
+        return results
+
+    # We return the records stored with a value, in the order they were inserted
+    def records(self, value):
+        node = self.search_node(value)
+        if node is None or node.records is None:
+            return []
+        return node.records
+
+    # We return what search() would return for each value, in the order of the values
+    def search_many(self, values):
+        return [node is not None for node in self._search_many(values)]
+
+    def contains_many(self, values):
+        return self.search_many(values)
 
     def find_min_node(self, node):
         while node is not None and node.left is not None:
             node = node.left
         return node
 
-    def _delete(self, node, value):
-        if node is None:
-            return None
-        elif value < node.value:
-            node.left = self._delete(node.left, value)
-        elif value > node.value:
-            node.right = self._delete(node.right, value)
+    def delete(self, value):
+        path = []
+        current = self.root
+        while current is not None and value != current.value:
+            path.append(current)
+            if value < current.value:
+                current = current.left
+            else:
+                current = current.right
+        if current is None or current.frequency == 0:
+            return
+        self.forget(value)
+        if self.tombstone_ratio is not None:
+            self.mark_deleted(current, path)
+            return
+        # A node with two children takes the value of its successor, and then we unlink the successor, which has no left child
+        if current.left is not None and current.right is not None:
+            path.append(current)
+            successor = current.right
+            while successor.left is not None:
+                path.append(successor)
+                successor = successor.left
+            self.forget(successor.value)
+            current.value = successor.value
+            current.frequency = successor.frequency
+            current.records = successor.records
+            current = successor
+        child = current.left if current.left is not None else current.right
+        if not path:
+            self.root = child
+        elif path[-1].left is current:
+            path[-1].left = child
         else:
-            if node.left is None:
-                return node.right
-            if node.right is None:
-                return node.left
-            successor = self.find_min_node(node.right)
-            node.value = successor.value
-            node.right = self._delete(node.right, successor.value)
+            path[-1].right = child
+        # Every node on the path lost a node beneath it, so we recalculate their counts from the bottom up
+        for ancestor in reversed(path):
+            ancestor.update()
+        # A scapegoat tree is rebuilt from scratch once deletes have removed more than 1 - alpha of its nodes
+        if self.alpha is not None and self.root is not None and self.root.node_count < self.alpha * self.max_node_count:
+            self.root = self.rebuild(self.root)
+            self.max_node_count = self.root.node_count
+
+    # A tombstone is a node with a frequency of 0, which stays in the tree until the next compaction
+    # Marking a node only has to subtract its frequency from the value counts of the nodes on its path, so it takes O(log n) time and never restructures the tree
+    # search() and the iterators skip tombstones, and calculate_size() does not count them
+    def mark_deleted(self, node, path):
+        for ancestor in path:
+            ancestor.value_count -= node.frequency
+        node.value_count -= node.frequency
+        node.frequency = 0
+        node.records = None
+        self.tombstones += 1
+        if self.tombstones > self.tombstone_ratio * self.root.node_count:
+            self.compact()
+
+    # We relink the live nodes into a perfectly balanced tree in one linear pass, so no nodes are allocated
+    def compact(self):
+        nodes = []
+        stack = []
+        current = self.root
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            if current.frequency:
+                nodes.append(current)
+            current = current.right
+        self.clear_cache()
+        self.tombstones = 0
+        self.root = self._relink(nodes, 0, len(nodes) - 1)
+        self.node_count = len(nodes)
+        self.value_count = self.root.value_count if self.root else 0
+        self.height = len(nodes).bit_length()
+        self.max_node_count = len(nodes)
+
+    def _relink(self, nodes, start, end):
+        if start > end:
+            return None
+        mid = (start + end) // 2
+        node = nodes[mid]
+        node.left = self._relink(nodes, start, mid - 1)
+        node.right = self._relink(nodes, mid + 1, end)
+        node.update()
         return node
 
-    def delete(self, value):
-        self.root = self._delete(self.root, value)
+    # We remove one record from the node of its value, and the node itself once its last occurrence is gone
+    def delete_record(self, value, record):
+        path = []
+        current = self.root
+        while current is not None and value != current.value:
+            path.append(current)
+            current = current.left if value < current.value else current.right
+        if current is None or current.records is None:
+            return False
+        for i, other in enumerate(current.records):
+            if other is record:
+                del current.records[i]
+                break
+        else:
+            return False
+        if current.frequency == 1:
+            self.delete(value)
+            return True
+        current.frequency -= 1
+        current.value_count -= 1
+        for ancestor in path:
+            ancestor.value_count -= 1
+        return True
 
     # We perform an inorder traversal to get a list of values in increasing order
-    def _tolist(self, node, arr):
-        if node is None:
-            return
-        self._tolist(node.left, arr)
-        for i in range(node.frequency):
-            arr.append(node.value)
-        self._tolist(node.right, arr)
-
     def tolist(self):
         arr = []
-        self._tolist(self.root, arr)
+        stack = []
+        current = self.root
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            for _ in range(current.frequency):
+                arr.append(current.value)
+            current = current.right
         return arr
 
-    def _calculate_height(self, node, height):
-        if node is None:
-            return
-        height += 1
-        if height > self.height:
-            self.height = height
-        self._calculate_height(node.left, height)
-        self._calculate_height(node.right, height)
+    # We return the smallest value that is greater than the given value, or None
+    def successor(self, value):
+        node = self.successor_node(value)
+        while node is not None and node.frequency == 0:
+            node = self.successor_node(node.value)
+        return node.value if node else None
 
-    def calculate_height(self):
-        self.height = 0
-        self._calculate_height(self.root, 0)
-        return self.height
+    def successor_node(self, value):
+        result = None
+        current = self.root
+        while current is not None:
+            if value < current.value:
+                result = current
+                current = current.left
+            else:
+                current = current.right
+        return result
 
-    def _calculate_size(self, node):
-        if node is None:
-            return
-        self.node_count += 1
-        self.value_count += node.frequency
-        self._calculate_size(node.left)
-        self._calculate_size(node.right)
+    # We return the largest value that is less than the given value, or None
+    def predecessor(self, value):
+        node = self.predecessor_node(value)
+        while node is not None and node.frequency == 0:
+            node = self.predecessor_node(node.value)
+        return node.value if node else None
+
+    def predecessor_node(self, value):
+        result = None
+        current = self.root
+        while current is not None:
+            if value > current.value:
+                result = current
+                current = current.right
+            else:
+                current = current.left
+        return result
+
+    # The nodes do not have parent pointers, so the iterators keep a stack of the ancestors they still have to visit, which takes O(height) memory
+    # We yield the nodes in increasing order, starting with the first node whose value is greater than or equal to the given value
+    def nodes_from(self, value):
+        stack = []
+        current = self.root
+        while current is not None:
+            if value <= current.value:
+                stack.append(current)
+                current = current.left
+            else:
+                current = current.right
+        while stack:
+            node = stack.pop()
+            if node.frequency:
+                yield node
+            current = node.right
+            while current is not None:
+                stack.append(current)
+                current = current.left
+
+    def range_nodes(self, lo, hi):
+        for node in self.nodes_from(lo):
+            if node.value > hi:
+                return
+            yield node
+
+    # We yield the values v such that lo <= v <= hi in increasing order, repeating each value as many times as it occurs, like tolist()
+    def range(self, lo, hi):
+        for node in self.range_nodes(lo, hi):
+            for _ in range(node.frequency):
+                yield node.value
+
+    # We yield (value, frequency) pairs in increasing order, starting with the first value greater than or equal to the given value
+    def items_from(self, value):
+        for node in self.nodes_from(value):
+            yield (node.value, node.frequency)
+
+    def reverse_iter(self):
+        stack = []
+        current = self.root
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.right
+            current = stack.pop()
+            for _ in range(current.frequency):
+                yield current.value
+            current = current.left
+
+    def calculate_height(self):
+        height = 0
+        stack = [(self.root, 1)] if self.root else []
+        while stack:
+            node, depth = stack.pop()
+            if depth > height:
+                height = depth
+            left, right = node.left, node.right
+            if left:
+                stack.append((left, depth + 1))
+            if right:
+                stack.append((right, depth + 1))
+        self.height = height
+        return height
 
     def calculate_size(self):
-        self.node_count = 0
-        self.value_count = 0
-        self._calculate_size(self.root)
+        if self.root is None:
+            self.node_count, self.value_count = 0, 0
+        else:
+            self.node_count, self.value_count = self.root.node_count - self.tombstones, self.root.value_count
         return (self.node_count, self.value_count)
 
+    # The rank of a value is the number of values in the tree that are less than it (or less than or equal to it, if inclusive is set)
+    def rank(self, value, inclusive=False):
+        rank = 0
+        current = self.root
+        while current is not None:
+            left_count = current.left.value_count if current.left else 0
+            if value == current.value:
+                rank += left_count
+                if inclusive:
+                    rank += current.frequency
+                break
+            elif value < current.value:
+                current = current.left
+            else:
+                rank += left_count + current.frequency
+                current = current.right
+        return rank
+
+    # We return the kth smallest value, counting from zero, where a value with a frequency of f takes up f positions
+    def select(self, k):
+        if self.root is None or k < 0 or k >= self.root.value_count:
+            raise IndexError('select index out of range')
+        current = self.root
+        while True:
+            left_count = current.left.value_count if current.left else 0
+            if k < left_count:
+                current = current.left
+            elif k < left_count + current.frequency:
+                return current.value
+            else:
+                k -= left_count + current.frequency
+                current = current.right
+
+    # We count the values v such that lo <= v <= hi
+    def count_range(self, lo, hi):
+        if hi < lo:
+            return 0
+        return self.rank(hi, inclusive=True) - self.rank(lo)
+
     # We perform a preorder traversal to get a string representation of the binary search tree
-    def _str(self, node):
-        if node is None:
-            return ''
-        elif node.left is None and node.right is None:
-            return f'{node.value}'
-        elif node.left and node.right is None:
-            leftchild = self._str(node.left)
-            return f'{node.value}({leftchild})'
-        elif node.left is None and node.right:
-            rightchild = self._str(node.right)
-            return f'{node.value}({rightchild})'
-        else:
-            leftchild = self._str(node.left)
-            rightchild = self._str(node.right)
-            return f'{node.value}({leftchild})({rightchild})'
+    # The stack holds the nodes we have yet to visit, along with the parentheses that surround them
+    # The tree is only read, never changed, so a string can be taken in the middle of a range() or items_from() iteration
+    def _str(self, write):
+        root = self._str_item(self.root)
+        stack = [root] if root else []
+        while stack:
+            item = stack.pop()
+            if item.__class__ is str:
+                write(item)
+                continue
+            if item.__class__ is tuple:
+                nodes, start, end = item
+                mid = (start + end) // 2
+                write(f'{nodes[mid].value}')
+                if mid < end:
+                    stack += (')', (nodes, mid + 1, end), '(')
+                if start < mid:
+                    stack += (')', (nodes, start, mid - 1), '(')
+                continue
+            write(f'{item.value}')
+            right, left = self._str_item(item.right), self._str_item(item.left)
+            if right:
+                stack += (')', right, '(')
+            if left:
+                stack += (')', left, '(')
+
+    # A tombstone can't simply be left out, because its children would lose their parent
+    # So we show the live values below a tombstone as the balanced subtree that compact() would build from them, as a (nodes, start, end) tuple, and None if there are none
+    def _str_item(self, node):
+        if node is None or node.frequency:
+            return node
+        nodes = []
+        stack = []
+        current = node
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            if current.frequency:
+                nodes.append(current)
+            current = current.right
+        return (nodes, 0, len(nodes) - 1) if nodes else None
 
     def str(self):
-        return self._str(self.root)
+        parts = []
+        self._str(parts.append)
+        return ''.join(parts)
+
+    # We stream the string representation to a file piece by piece, so the whole string is never held in memory
+    def write(self, file):
+        self._str(file.write)
+
+    # We yield (value, frequency, depth, red) tuples in increasing order for snapshot.save()
+    # A binary search tree is rebuilt balanced when it is loaded, so we do not save its shape
+    def _entries(self):
+        stack = []
+        current = self.root
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            yield (current.value, current.frequency, 0, 0)
+            current = current.right
+
+    # We copy the keys and frequencies into a read-only StaticIndex, which is faster to search and much smaller than the nodes
+    def freeze(self, layout='sorted', use_numpy=False):
+        if self.tombstones:
+            self.compact()
+        keys = []
+        frequencies = []
+        for value, frequency, _, _ in self._entries():
+            keys.append(value)
+            frequencies.append(frequency)
+        return staticindex.StaticIndex(keys, frequencies, layout, use_numpy)
+
+    def save(self, path):
+        if self.tombstones:
+            self.compact()
+        node_count, value_count = self.calculate_size()
+        typecode = snapshot.keys_typecode(value for value, _, _, _ in self._entries())
+        snapshot.save(path, self._entries(), node_count, typecode)
+
+    def load(self, path):
+        snapshot.load(path, lambda keys, frequencies, shapes: self._load(keys, frequencies))
 
     def __str__(self):
         return self.str()
 
+    # The root value is the root that str() shows, so it is a live value even if the root node is a tombstone
     def stats(self):
-        root_value = self.root.value if self.root else None
+        root = self._str_item(self.root)
+        if root.__class__ is tuple:
+            nodes, start, end = root
+            root = nodes[(start + end) // 2]
+        root_value = root.value if root else None
         node_count, value_count = self.calculate_size()
         height = self.calculate_height()
         return f'Root value: {root_value} Node count: {node_count} Value count: {value_count} Height: {height}'
@@ -381,6 +935,21 @@ class Node:
         self.left = None
         self.right = None
         self.frequency = 1
+        # The records of a node are only stored in a list once the first record arrives, so a tree without records pays for nothing more than this attribute
+        self.records = None
+        self.node_count = 1
+        self.value_count = 1
+
+    # Every node keeps the number of nodes and the number of values in its subtree
+    def update(self):
+        self.node_count = 1
+        self.value_count = self.frequency
+        if self.left is not None:
+            self.node_count += self.left.node_count
+            self.value_count += self.left.value_count
+        if self.right is not None:
+            self.node_count += self.right.node_count
+            self.value_count += self.right.value_count
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(prog='bst2.py', description='Binary search')
@@ -388,35 +957,43 @@ if __name__ == '__main__':
     group.add_argument('-i', '--inputfile', type=str)
     group.add_argument('-n', '--numbers', nargs='+', type=int) 
     group.add_argument('-r', '--random', action='store_true')
+    group.add_argument('-l', '--loadfile', type=str)
     parser.add_argument('-s', '--size', type=float, default=10)
     parser.add_argument('-min', '--minimum', type=float, default=0)
     parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
     parser.add_argument('-t', '--test', nargs='+', type=int)
     parser.add_argument('-o', '--outputfile', type=str)
+    parser.add_argument('-d', '--dumpfile', type=str)
     args = parser.parse_args()
     if args.inputfile:
-        with open(args.inputfile, 'r') as file:
-            contents = file.read()
-            arr = ast.literal_eval(contents)
+        arr = dataio.read(args.inputfile, args.format)
     elif args.numbers:
         arr = args.numbers
     elif args.random:
         size, min, max = int(args.size), int(args.minimum), int(args.maximum)
         arr = [random.randint(min, max) for i in range(size)]
-    if len(arr) <= 1000:
-        print(f'Unsorted list')
-        print('------------------------------')
-        print(f'{arr}\n')
-    tree = BinarySearchTree(arr)
+    if args.loadfile:
+        tree = BinarySearchTree()
+        start_time = time.time()
+        tree.load(args.loadfile)
+        time_elapsed = 1000 * (time.time() - start_time)
+        print(f'Loaded {args.loadfile} in {time_elapsed:.4f} milliseconds\n')
+        arr = tree.tolist() if args.test else []
+    else:
+        if len(arr) <= 1000:
+            print(f'Unsorted list')
+            print('------------------------------')
+            print(f'{list(arr)}\n')
+        tree = BinarySearchTree(arr)
     print('Statistics')
     print('------------------------------')
     print(tree.stats())
-    prefix_expression = tree.str()
     if tree.node_count <= 1000:
         print('')
         print('String representation')
         print('------------------------------')
-        print(prefix_expression)
+        print(tree.str())
     if args.test:
         print('')
         print('Linear search results')
@@ -448,4 +1025,6 @@ if __name__ == '__main__':
                 print('')
     if args.outputfile:
         with open(args.outputfile, 'w') as file:
-            file.write(prefix_expression)
+            tree.write(file)
+    if args.dumpfile:
+        tree.save(args.dumpfile)
@@ -0,0 +1,372 @@
+# ###### Introduction ######
+#
+# This file contains a B+ tree that lives in a file on disk, for indexes that are too big to keep in memory as a binary search tree
+#
+# The binary search trees in this repository hold one key per node, and every node is a separate object somewhere in memory
+#
+# A B+ tree holds many keys per node, and every node is a fixed-size page in a file
+#
+# Internal pages hold keys and the page numbers of their children, and leaf pages hold keys and their frequencies
+#
+# Every leaf page points to the next leaf page, so a range scan finds its first leaf and then reads the leaves in order
+#
+# With 4096 byte pages a leaf holds 255 keys and an internal page holds 340 keys, so a billion keys fit in a tree that is four pages deep
+#
+# The file is memory-mapped, and the pages we have used most recently are kept decoded in an LRU cache of configurable size
+#
+# A changed page is written back to the file when it is evicted from the cache, or when we call flush() or close()
+#
+# Page 0 holds the metadata: the magic bytes b'BTRE', the page size, the key typecode, the root page, the number of pages, and the number of nodes and values
+#
+# The tree has the same search(), insert(), delete(), range() and to_list() methods as the trees in bst.py and redblacktree.py
+#
+# The search() method returns the frequency of a key, or None if the key is missing
+#
+# The delete() method removes the key from its leaf without merging pages, so a page can be left with fewer keys than usual (or none), which keeps deletes cheap and never breaks a search
+#
+# ###### Examples ######
+#
+# Example 1: Create an index of one million random keys and search it
+#
+# % python btree.py -f index.db -r -s 1e6 -max 1e9 -t 42
+#
+# Example 2: Open the index again with a small cache and scan a range of keys
+#
+# % python btree.py -f index.db -c 16 -R 1000 2000
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import random
+import time
+import argparse
+import dataio
+from collections import OrderedDict
+
+MAGIC = b'BTRE'
+METADATA = struct.Struct('<4sIcxxxIIQQ')
+PAGE_HEADER = struct.Struct('<BxHI')
+LEAF = 1
+INTERNAL = 0
+
+class Page:
+    def __init__(self, number, kind, keys=None, values=None, next=0):
+        self.number = number
+        self.kind = kind
+        self.keys = keys if keys is not None else []
+        # A leaf page holds the frequency of each key, and an internal page holds the page numbers of its children
+        self.values = values if values is not None else []
+        self.next = next
+        self.dirty = True
+
+class BTree:
+    def __init__(self, path, page_size=4096, cache_size=256, typecode='q'):
+        self.cache_size = cache_size if cache_size > 0 else 1
+        self.cache = OrderedDict()
+        self.reads = 0
+        self.hits = 0
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            metadata = METADATA.unpack(self.file.read(METADATA.size))
+            magic, self.page_size, typecode, self.root, self.page_count, self.node_count, self.value_count = metadata
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a B+ tree index')
+            self.typecode = typecode.decode()
+        else:
+            self.page_size = page_size
+            self.typecode = typecode
+            self.root = 0
+            self.page_count = 1
+            self.node_count = 0
+            self.value_count = 0
+            self.file.truncate(self.page_size)
+        self.leaf_capacity = (self.page_size - PAGE_HEADER.size) // 16
+        self.internal_capacity = (self.page_size - PAGE_HEADER.size - 4) // 12
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        if self.root == 0:
+            self.root = self.allocate(LEAF).number
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # ###### Pages ######
+
+    def allocate(self, kind):
+        number = self.page_count
+        self.page_count += 1
+        if self.page_count * self.page_size > len(self.map):
+            # We double the size of the file, so that growing it takes amortized constant time per page
+            self.write_back()
+            self.map.close()
+            self.file.truncate(2 * self.page_count * self.page_size)
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        page = Page(number, kind)
+        self.remember(page)
+        return page
+
+    def page(self, number):
+        page = self.cache.get(number)
+        if page is not None:
+            self.hits += 1
+            self.cache.move_to_end(number)
+            return page
+        self.reads += 1
+        page = self.decode(number)
+        self.remember(page)
+        return page
+
+    def remember(self, page):
+        self.cache[page.number] = page
+        self.cache.move_to_end(page.number)
+        while len(self.cache) > self.cache_size:
+            number, evicted = self.cache.popitem(last=False)
+            if evicted.dirty:
+                self.encode(evicted)
+
+    # Every change to a page is followed by a call to modified(), which puts the page back in the cache if it was evicted while we were holding on to it
+    def modified(self, page):
+        page.dirty = True
+        self.remember(page)
+
+    def decode(self, number):
+        offset = number * self.page_size
+        kind, count, next = PAGE_HEADER.unpack_from(self.map, offset)
+        offset += PAGE_HEADER.size
+        keys = array.array(self.typecode)
+        keys.frombytes(self.map[offset:offset + 8 * count])
+        offset += 8 * count
+        if kind == LEAF:
+            values = array.array('q')
+            values.frombytes(self.map[offset:offset + 8 * count])
+        else:
+            values = array.array('I')
+            values.frombytes(self.map[offset:offset + 4 * (count + 1)])
+        page = Page(number, kind, keys.tolist(), values.tolist(), next)
+        page.dirty = False
+        return page
+
+    def encode(self, page):
+        offset = page.number * self.page_size
+        PAGE_HEADER.pack_into(self.map, offset, page.kind, len(page.keys), page.next)
+        offset += PAGE_HEADER.size
+        keys = array.array(self.typecode, page.keys).tobytes()
+        values = array.array('q' if page.kind == LEAF else 'I', page.values).tobytes()
+        self.map[offset:offset + len(keys)] = keys
+        offset += len(keys)
+        self.map[offset:offset + len(values)] = values
+        page.dirty = False
+
+    def write_back(self):
+        for page in self.cache.values():
+            if page.dirty:
+                self.encode(page)
+
+    def flush(self):
+        self.write_back()
+        METADATA.pack_into(self.map, 0, MAGIC, self.page_size, self.typecode.encode(), self.root, self.page_count, self.node_count, self.value_count)
+        self.map.flush()
+
+    def close(self):
+        if self.map.closed:
+            return
+        self.flush()
+        self.map.close()
+        self.file.close()
+
+    # ###### Operations ######
+
+    # We return the leaf page that could hold the key, along with the internal pages on the way down and the child index we took in each
+    def find_leaf(self, key):
+        path = []
+        page = self.page(self.root)
+        while page.kind == INTERNAL:
+            index = bisect.bisect_right(page.keys, key)
+            path.append((page, index))
+            page = self.page(page.values[index])
+        return page, path
+
+    def search(self, key):
+        leaf, path = self.find_leaf(key)
+        index = bisect.bisect_left(leaf.keys, key)
+        if index < len(leaf.keys) and leaf.keys[index] == key:
+            return leaf.values[index]
+        return None
+
+    def insert(self, key):
+        leaf, path = self.find_leaf(key)
+        self.value_count += 1
+        index = bisect.bisect_left(leaf.keys, key)
+        if index < len(leaf.keys) and leaf.keys[index] == key:
+            leaf.values[index] += 1
+            self.modified(leaf)
+            return
+        self.node_count += 1
+        # A page is never written back while it holds more keys than fit, so we allocate the page for the split before we add the key
+        right = self.allocate(LEAF) if len(leaf.keys) == self.leaf_capacity else None
+        leaf.keys.insert(index, key)
+        leaf.values.insert(index, 1)
+        self.modified(leaf)
+        if right is None:
+            return
+        # The leaf is full, so we move its upper half to a new leaf and pass the first key of the new leaf up to the parent
+        middle = len(leaf.keys) // 2
+        right.keys = leaf.keys[middle:]
+        right.values = leaf.values[middle:]
+        del leaf.keys[middle:]
+        del leaf.values[middle:]
+        right.next = leaf.next
+        leaf.next = right.number
+        self.modified(leaf)
+        self.modified(right)
+        separator = right.keys[0]
+        while path:
+            parent, index = path.pop()
+            sibling = self.allocate(INTERNAL) if len(parent.keys) == self.internal_capacity else None
+            parent.keys.insert(index, separator)
+            parent.values.insert(index + 1, right.number)
+            self.modified(parent)
+            if sibling is None:
+                return
+            # The internal page is full, so we move its upper half to a new page and pass its middle key up to the parent
+            middle = len(parent.keys) // 2
+            separator = parent.keys[middle]
+            sibling.keys = parent.keys[middle + 1:]
+            sibling.values = parent.values[middle + 1:]
+            del parent.keys[middle:]
+            del parent.values[middle + 1:]
+            self.modified(parent)
+            self.modified(sibling)
+            right = sibling
+        # The root was split, so the tree grows by one level
+        root = self.allocate(INTERNAL)
+        root.keys = [separator]
+        root.values = [self.root, right.number]
+        self.modified(root)
+        self.root = root.number
+
+    def delete(self, key):
+        leaf, path = self.find_leaf(key)
+        index = bisect.bisect_left(leaf.keys, key)
+        if index == len(leaf.keys) or leaf.keys[index] != key:
+            return
+        self.node_count -= 1
+        self.value_count -= leaf.values[index]
+        del leaf.keys[index]
+        del leaf.values[index]
+        self.modified(leaf)
+
+    # We yield (key, frequency) pairs in increasing order, starting with the first key greater than or equal to the given key
+    def items_from(self, key):
+        leaf, path = self.find_leaf(key)
+        index = bisect.bisect_left(leaf.keys, key)
+        while True:
+            while index < len(leaf.keys):
+                yield (leaf.keys[index], leaf.values[index])
+                index += 1
+            if leaf.next == 0:
+                return
+            leaf = self.page(leaf.next)
+            index = 0
+
+    # We yield the keys k such that lo <= k <= hi in increasing order, repeating each key as many times as it occurs
+    def range(self, lo, hi):
+        for key, frequency in self.items_from(lo):
+            if key > hi:
+                return
+            for _ in range(frequency):
+                yield key
+
+    def to_list(self):
+        page = self.page(self.root)
+        while page.kind == INTERNAL:
+            page = self.page(page.values[0])
+        sorted_list = []
+        while True:
+            for key, frequency in zip(page.keys, page.values):
+                sorted_list.extend([key] * frequency)
+            if page.next == 0:
+                return sorted_list
+            page = self.page(page.next)
+
+    def size(self):
+        return (self.node_count, self.value_count)
+
+    def height(self):
+        height = 1
+        page = self.page(self.root)
+        while page.kind == INTERNAL:
+            page = self.page(page.values[0])
+            height += 1
+        return height
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='btree.py', description='Disk-resident B+ tree index')
+    parser.add_argument('-f', '--indexfile', type=str, required=True)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-i', '--inputfile', type=str)
+    group.add_argument('-n', '--numbers', nargs='+', type=int)
+    group.add_argument('-r', '--random', action='store_true')
+    parser.add_argument('-s', '--size', type=float, default=10)
+    parser.add_argument('-min', '--minimum', type=float, default=0)
+    parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
+    parser.add_argument('-p', '--pagesize', type=int, default=4096)
+    parser.add_argument('-c', '--cachesize', type=int, default=256)
+    parser.add_argument('-t', '--test', nargs='+', type=int)
+    parser.add_argument('-R', '--range', nargs=2, type=int)
+    args = parser.parse_args()
+    arr = []
+    if args.inputfile:
+        arr = dataio.read(args.inputfile, args.format)
+    elif args.numbers:
+        arr = args.numbers
+    elif args.random:
+        size, min, max = int(args.size), int(args.minimum), int(args.maximum)
+        arr = [random.randint(min, max) for i in range(size)]
+    # A new index stores floats if any key is a float, but an existing index keeps the typecode it was created with
+    typecode = 'd' if any(isinstance(value, float) for value in arr) else 'q'
+    with BTree(args.indexfile, page_size=args.pagesize, cache_size=args.cachesize, typecode=typecode) as tree:
+        if tree.typecode == 'q' and typecode == 'd':
+            parser.error(f'{args.indexfile} stores integer keys, so it can\'t index floats')
+        if arr:
+            start_time = time.time()
+            for value in arr:
+                tree.insert(value)
+            time_elapsed = 1000 * (time.time() - start_time)
+            print(f'Inserted {len(arr)} keys in {time_elapsed:.4f} milliseconds\n')
+        node_count, value_count = tree.size()
+        print('Statistics')
+        print('------------------------------')
+        print(f'Node count: {node_count} Value count: {value_count} Height: {tree.height()} Pages: {tree.page_count} Page size: {tree.page_size}')
+        if args.test:
+            print('')
+            print('Search results')
+            print('------------------------------')
+            for i in range(len(args.test)):
+                value = args.test[i]
+                reads = tree.reads
+                start_time = time.time()
+                found = tree.search(value)
+                time_elapsed = 1000 * (time.time() - start_time)
+                print(f'{value} is present' if found else f'{value} is missing')
+                print(f'The search took {time_elapsed:.4f} milliseconds and read {tree.reads - reads} pages from the file')
+                if i < len(args.test) - 1:
+                    print('')
+        if args.range:
+            lo, hi = args.range
+            reads = tree.reads
+            start_time = time.time()
+            values = list(tree.range(lo, hi))
+            time_elapsed = 1000 * (time.time() - start_time)
+            print('')
+            print('Range results')
+            print('------------------------------')
+            if len(values) <= 1000:
+                print(values)
+            print(f'Found {len(values)} values in {time_elapsed:.4f} milliseconds and read {tree.reads - reads} pages from the file')
@@ -0,0 +1,490 @@
+# ###### Introduction ######
+#
+# This file contains a red-black tree that stores its nodes in parallel typed arrays instead of Node objects
+#
+# The redblacktree.py file in this repository creates one Node object for each key
+#
+# Every Node object has a dictionary of six attributes, and it stores its color as the string 'red' or 'black'
+#
+# That is convenient, but it takes a lot of memory, and following the pointers between objects is slow
+#
+# In this file a node is just an index
+#
+# The key of node i is keys[i], its children are left[i] and right[i], its parent is parent[i], and its frequency is frequency[i]
+#
+# The color of node i is a single bit in a bit array (1 means red, 0 means black)
+#
+# Index 0 is the NIL node, so an index of 0 means that there is no child or no parent (the NIL node is always black)
+#
+# When we delete a node, its index goes on a free list, and the next insert reuses it
+#
+# The free list is chained through the left array, so it costs no extra memory
+#
+# The tree has the same insert(), search(), delete() and to_list() methods as the RedBlackTree class
+#
+# The search() method returns the index of the node, or None if the value is missing
+#
+# ###### Examples ######
+#
+# Example 1: Create a tree of one million random keys and compare its memory usage with the object version
+#
+# % python compactredblacktree.py -r -s 1e6 -max 1e9 -c
+
+import array
+import sys
+import random
+import time
+import argparse
+import dataio
+import redblacktree
+
+class CompactRedBlackTree:
+    # Without a typecode, we store the keys as floats if any of them is a float (like the values of a float64 file), and as 64-bit integers otherwise
+    def __init__(self, arr=None, typecode=None):
+        if typecode is None:
+            typecode = 'd' if arr and any(isinstance(value, float) for value in arr) else 'q'
+        self.typecode = typecode
+        self.keys = array.array(typecode, [0])
+        self.left = array.array('i', [0])
+        self.right = array.array('i', [0])
+        self.parent = array.array('i', [0])
+        self.frequency = array.array('I', [0])
+        self.color = bytearray(1)
+        self.root = 0
+        self.free = 0
+        self.node_count = 0
+        self.value_count = 0
+        if arr:
+            self.bulk_load(arr)
+
+    def is_red(self, index):
+        return (self.color[index >> 3] >> (index & 7)) & 1
+
+    def set_red(self, index):
+        self.color[index >> 3] |= 1 << (index & 7)
+
+    def set_black(self, index):
+        self.color[index >> 3] &= ~(1 << (index & 7))
+
+    def allocate(self, value):
+        if self.free:
+            index = self.free
+            # We store the key first, so a key that doesn't fit the typecode leaves the free list as it was
+            self.keys[index] = value
+            self.free = self.left[index]
+            self.left[index] = 0
+            self.right[index] = 0
+            self.parent[index] = 0
+            self.frequency[index] = 1
+        else:
+            index = len(self.keys)
+            self.keys.append(value)
+            self.left.append(0)
+            self.right.append(0)
+            self.parent.append(0)
+            self.frequency.append(1)
+            if index >> 3 >= len(self.color):
+                self.color.append(0)
+        self.set_red(index)
+        return index
+
+    def release(self, index):
+        self.set_black(index)
+        self.frequency[index] = 0
+        self.right[index] = 0
+        self.parent[index] = 0
+        self.left[index] = self.free
+        self.free = index
+
+    # The keys are stored in sorted order, so the index of a node is its position in the inorder traversal plus one
+    # As in redblacktree.py, the deepest level is colored red and every other level is colored black
+    def bulk_load(self, arr, presorted=False):
+        if not presorted:
+            arr = sorted(arr)
+        values = []
+        counts = []
+        for value in arr:
+            if values and value == values[-1]:
+                counts[-1] += 1
+            else:
+                values.append(value)
+                counts.append(1)
+        self._load(values, counts)
+
+    def _load(self, values, counts):
+        size = len(values) + 1
+        self.keys = array.array(self.typecode, [0])
+        self.keys.extend(values)
+        self.frequency = array.array('I', [0])
+        self.frequency.extend(counts)
+        self.left = array.array('i', bytes(4 * size))
+        self.right = array.array('i', bytes(4 * size))
+        self.parent = array.array('i', bytes(4 * size))
+        self.color = bytearray((size + 7) // 8)
+        self.free = 0
+        self.node_count = len(values)
+        self.value_count = sum(counts)
+        red_depth = len(values).bit_length() - 1
+        self.root = self._build(1, len(values), 0, red_depth)
+        if self.root:
+            self.set_black(self.root)
+
+    def _build(self, start, end, depth, red_depth):
+        if start > end:
+            return 0
+        mid = (start + end) // 2
+        if depth == red_depth:
+            self.set_red(mid)
+        left = self._build(start, mid - 1, depth + 1, red_depth)
+        right = self._build(mid + 1, end, depth + 1, red_depth)
+        self.left[mid] = left
+        self.right[mid] = right
+        if left:
+            self.parent[left] = mid
+        if right:
+            self.parent[right] = mid
+        return mid
+
+    def search(self, value):
+        keys, left, right = self.keys, self.left, self.right
+        current = self.root
+        while current:
+            key = keys[current]
+            if value == key:
+                return current
+            elif value < key:
+                current = left[current]
+            else:
+                current = right[current]
+        return None
+
+    def insert(self, value):
+        keys = self.keys
+        parent = 0
+        current = self.root
+        while current:
+            key = keys[current]
+            if value == key:
+                self.frequency[current] += 1
+                self.value_count += 1
+                return
+            parent = current
+            if value < key:
+                current = self.left[current]
+            else:
+                current = self.right[current]
+        # We only count the value once allocate() has stored it, because a key that doesn't fit the typecode raises there
+        node = self.allocate(value)
+        self.node_count += 1
+        self.value_count += 1
+        self.parent[node] = parent
+        if parent == 0:
+            self.root = node
+        elif value < keys[parent]:
+            self.left[parent] = node
+        else:
+            self.right[parent] = node
+        self.insert_fix(node)
+
+    def insert_fix(self, node):
+        left, right, parent = self.left, self.right, self.parent
+        while self.is_red(parent[node]):
+            grandparent = parent[parent[node]]
+            if parent[node] == left[grandparent]:
+                uncle = right[grandparent]
+                if self.is_red(uncle):
+                    self.set_black(parent[node])
+                    self.set_black(uncle)
+                    self.set_red(grandparent)
+                    node = grandparent
+                else:
+                    if node == right[parent[node]]:
+                        node = parent[node]
+                        self.rotate_left(node)
+                    self.set_black(parent[node])
+                    self.set_red(parent[parent[node]])
+                    self.rotate_right(parent[parent[node]])
+            else:
+                uncle = left[grandparent]
+                if self.is_red(uncle):
+                    self.set_black(parent[node])
+                    self.set_black(uncle)
+                    self.set_red(grandparent)
+                    node = grandparent
+                else:
+                    if node == left[parent[node]]:
+                        node = parent[node]
+                        self.rotate_right(node)
+                    self.set_black(parent[node])
+                    self.set_red(parent[parent[node]])
+                    self.rotate_left(parent[parent[node]])
+        self.set_black(self.root)
+
+    # The NIL node stands in for a missing child, so x always has a parent, even when x is NIL
+    def delete(self, value):
+        node = self.search(value)
+        if node is None:
+            return
+        left, right, parent = self.left, self.right, self.parent
+        self.node_count -= 1
+        self.value_count -= self.frequency[node]
+        removed_red = self.is_red(node)
+        if left[node] == 0:
+            x = right[node]
+            self.transplant(node, x)
+        elif right[node] == 0:
+            x = left[node]
+            self.transplant(node, x)
+        else:
+            successor = self.find_min(right[node])
+            removed_red = self.is_red(successor)
+            x = right[successor]
+            if parent[successor] == node:
+                parent[x] = successor
+            else:
+                self.transplant(successor, x)
+                right[successor] = right[node]
+                parent[right[successor]] = successor
+            self.transplant(node, successor)
+            left[successor] = left[node]
+            parent[left[successor]] = successor
+            if self.is_red(node):
+                self.set_red(successor)
+            else:
+                self.set_black(successor)
+        self.release(node)
+        if not removed_red:
+            self.delete_fix(x)
+        parent[0] = 0
+
+    def delete_fix(self, x):
+        left, right, parent = self.left, self.right, self.parent
+        while x != self.root and not self.is_red(x):
+            if x == left[parent[x]]:
+                sibling = right[parent[x]]
+                if self.is_red(sibling):
+                    self.set_black(sibling)
+                    self.set_red(parent[x])
+                    self.rotate_left(parent[x])
+                    sibling = right[parent[x]]
+                if not self.is_red(left[sibling]) and not self.is_red(right[sibling]):
+                    self.set_red(sibling)
+                    x = parent[x]
+                else:
+                    if not self.is_red(right[sibling]):
+                        self.set_black(left[sibling])
+                        self.set_red(sibling)
+                        self.rotate_right(sibling)
+                        sibling = right[parent[x]]
+                    if self.is_red(parent[x]):
+                        self.set_red(sibling)
+                    else:
+                        self.set_black(sibling)
+                    self.set_black(parent[x])
+                    self.set_black(right[sibling])
+                    self.rotate_left(parent[x])
+                    x = self.root
+            else:
+                sibling = left[parent[x]]
+                if self.is_red(sibling):
+                    self.set_black(sibling)
+                    self.set_red(parent[x])
+                    self.rotate_right(parent[x])
+                    sibling = left[parent[x]]
+                if not self.is_red(left[sibling]) and not self.is_red(right[sibling]):
+                    self.set_red(sibling)
+                    x = parent[x]
+                else:
+                    if not self.is_red(left[sibling]):
+                        self.set_black(right[sibling])
+                        self.set_red(sibling)
+                        self.rotate_left(sibling)
+                        sibling = left[parent[x]]
+                    if self.is_red(parent[x]):
+                        self.set_red(sibling)
+                    else:
+                        self.set_black(sibling)
+                    self.set_black(parent[x])
+                    self.set_black(left[sibling])
+                    self.rotate_right(parent[x])
+                    x = self.root
+        self.set_black(x)
+
+    def rotate_left(self, node):
+        left, right, parent = self.left, self.right, self.parent
+        right_child = right[node]
+        right[node] = left[right_child]
+        if left[right_child]:
+            parent[left[right_child]] = node
+        parent[right_child] = parent[node]
+        if parent[node] == 0:
+            self.root = right_child
+        elif node == left[parent[node]]:
+            left[parent[node]] = right_child
+        else:
+            right[parent[node]] = right_child
+        left[right_child] = node
+        parent[node] = right_child
+
+    def rotate_right(self, node):
+        left, right, parent = self.left, self.right, self.parent
+        left_child = left[node]
+        left[node] = right[left_child]
+        if right[left_child]:
+            parent[right[left_child]] = node
+        parent[left_child] = parent[node]
+        if parent[node] == 0:
+            self.root = left_child
+        elif node == right[parent[node]]:
+            right[parent[node]] = left_child
+        else:
+            left[parent[node]] = left_child
+        right[left_child] = node
+        parent[node] = left_child
+
+    def transplant(self, old_node, new_node):
+        parent = self.parent[old_node]
+        if parent == 0:
+            self.root = new_node
+        elif old_node == self.left[parent]:
+            self.left[parent] = new_node
+        else:
+            self.right[parent] = new_node
+        self.parent[new_node] = parent
+
+    def find_min(self, node):
+        while self.left[node]:
+            node = self.left[node]
+        return node
+
+    def to_list(self):
+        sorted_list = []
+        stack = []
+        current = self.root
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = self.left[current]
+            current = stack.pop()
+            key = self.keys[current]
+            for _ in range(self.frequency[current]):
+                sorted_list.append(key)
+            current = self.right[current]
+        return sorted_list
+
+    def size(self):
+        return (self.node_count, self.value_count)
+
+    def height(self):
+        height = 0
+        level = [self.root] if self.root else []
+        while level:
+            next_level = []
+            for node in level:
+                if self.left[node]:
+                    next_level.append(self.left[node])
+                if self.right[node]:
+                    next_level.append(self.right[node])
+            level = next_level
+            height += 1
+        return height
+
+    def _str(self, write):
+        stack = [self.root] if self.root else []
+        while stack:
+            item = stack.pop()
+            if item.__class__ is str:
+                write(item)
+                continue
+            write(f'{self.keys[item]}')
+            if self.right[item]:
+                stack += (')', self.right[item], '(')
+            if self.left[item]:
+                stack += (')', self.left[item], '(')
+
+    def str(self):
+        parts = []
+        self._str(parts.append)
+        return ''.join(parts)
+
+    def __str__(self):
+        return self.str()
+
+    def memory_usage(self):
+        arrays = (self.keys, self.left, self.right, self.parent, self.frequency, self.color)
+        return sum(sys.getsizeof(arr) for arr in arrays)
+
+# We estimate the memory of a RedBlackTree by adding up each Node object, its attribute dictionary and its key
+def object_memory_usage(tree):
+    total = sys.getsizeof(tree)
+    stack = [tree.root] if tree.root else []
+    while stack:
+        node = stack.pop()
+        total += sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.value)
+        if node.left:
+            stack.append(node.left)
+        if node.right:
+            stack.append(node.right)
+    return total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='compactredblacktree.py', description='Compact red black tree')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-i', '--inputfile', type=str)
+    group.add_argument('-n', '--numbers', nargs='+', type=int)
+    group.add_argument('-r', '--random', action='store_true')
+    parser.add_argument('-s', '--size', type=float, default=10)
+    parser.add_argument('-min', '--minimum', type=float, default=0)
+    parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
+    parser.add_argument('-t', '--test', nargs='+', type=int)
+    parser.add_argument('-c', '--compare', action='store_true')
+    parser.add_argument('-o', '--outputfile', type=str)
+    args = parser.parse_args()
+    if args.inputfile:
+        arr = dataio.read(args.inputfile, args.format)
+    elif args.numbers:
+        arr = args.numbers
+    elif args.random:
+        size, min, max = int(args.size), int(args.minimum), int(args.maximum)
+        arr = [random.randint(min, max) for i in range(size)]
+    if len(arr) <= 1000:
+        print(f'Unsorted list')
+        print('------------------------------')
+        print(f'{list(arr)}\n')
+    tree = CompactRedBlackTree(arr)
+    root_value = tree.keys[tree.root] if tree.root else None
+    node_count, value_count = tree.size()
+    height = tree.height()
+    print('Statistics')
+    print('------------------------------')
+    print(f'Root value: {root_value} Node count: {node_count} Value count: {value_count} Height: {height}')
+    print('')
+    print('Memory usage')
+    print('------------------------------')
+    memory = tree.memory_usage()
+    print(f'Compact tree: {memory} bytes ({memory / (node_count or 1):.1f} bytes per key)')
+    if args.compare:
+        object_memory = object_memory_usage(redblacktree.RedBlackTree(arr))
+        print(f'Object tree: {object_memory} bytes ({object_memory / (node_count or 1):.1f} bytes per key)')
+    if node_count <= 1000:
+        print('')
+        print('String representation')
+        print('------------------------------')
+        print(tree.str())
+    if args.test:
+        print('')
+        print('Binary search results')
+        print('------------------------------')
+        for i in range(len(args.test)):
+            value = args.test[i]
+            start_time = time.time()
+            found = tree.search(value)
+            time_elapsed = 1000 * (time.time() - start_time)
+            print(f'{value} is present' if found else f'{value} is missing')
+            print(f'The binary search took {time_elapsed:.4f} milliseconds')
+            if i < len(args.test) - 1:
+                print('')
+    if args.outputfile:
+        with open(args.outputfile, 'w') as file:
+            file.write(tree.str())
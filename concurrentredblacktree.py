@@ -0,0 +1,364 @@
+# ###### Introduction ######
+#
+# This file contains a red-black tree that many threads can read while one thread at a time writes to it
+#
+# The RedBlackTree class in redblacktree.py changes its nodes in place, so a reader that runs during a rotation can follow a pointer into the wrong subtree
+#
+# The usual fix is to put one lock around the whole tree, but then every reader waits for every writer
+#
+# In this file the nodes never change after they are created
+#
+# An insert or a delete copies the nodes on the path it changes and builds a new root, while the rest of the tree is shared with the old root
+#
+# This is called path copying, and a tree that keeps its old versions around like this is called a persistent tree
+#
+# The writers take a lock, so they are applied one at a time, and the last thing a writer does is store the new root in self.root
+#
+# Storing an attribute is atomic, so a reader sees either the old root or the new root, and never a tree that is half updated
+#
+# A reader calls snapshot() to get a view of the tree as it was at that moment, and the view never changes, no matter how many writes come after it
+#
+# The readers never take a lock, and an old version is freed by the garbage collector once no snapshot refers to it
+#
+# ###### Split and join ######
+#
+# Rotations would have to copy every node they touch, and the rebalancing of a delete can rotate anywhere along the path, so we build delete() out of split and join instead
+#
+# join(left, value, frequency, right) builds a tree out of a tree of smaller values, a value, and a tree of greater values, in time proportional to the difference of their black heights
+#
+# split(tree, value) returns a tree of the smaller values, the node holding the value, and a tree of the greater values, in O(log n) time
+#
+# delete(value) splits the tree at the value and joins the two halves back together without the node, so it only creates new nodes along the path from the root to the value
+#
+# insert(value) is simpler, because the only thing that can go wrong is a red node with a red child, and we fix that while we copy the path back up
+#
+# Every node stores its black height, which is what join() needs, and the number of nodes and values below it, so the size of a snapshot is O(1)
+#
+# ###### Examples ######
+#
+# Example 1: Create a tree of 1000 random keys and search for a few of them
+#
+# % python concurrentredblacktree.py -r -s 1000 -max 10000 -t 5 17 2048
+#
+# Example 2: Compare the throughput with a RedBlackTree behind a global lock, for 4 threads and 1%, 10% and 50% writes
+#
+# % python benchmark.py -b concurrency -k 1e5 -w 4 --writes 0.01 0.1 0.5
+
+import random
+import threading
+import argparse
+import dataio
+
+class Node:
+    __slots__ = ('value', 'frequency', 'color', 'left', 'right', 'height', 'node_count', 'value_count')
+
+    def __init__(self, value, frequency, color, left, right):
+        self.value = value
+        self.frequency = frequency
+        self.color = color
+        self.left = left
+        self.right = right
+        self.height = black_height(left) + (1 if color == 'black' else 0)
+        self.node_count = 1
+        self.value_count = frequency
+        if left is not None:
+            self.node_count += left.node_count
+            self.value_count += left.value_count
+        if right is not None:
+            self.node_count += right.node_count
+            self.value_count += right.value_count
+
+    def __str__(self):
+        return f'{self.value} ({self.color}, {self.frequency})'
+
+def black_height(node):
+    return node.height if node is not None else 0
+
+def is_red(node):
+    return node is not None and node.color == 'red'
+
+def blacken(node):
+    return Node(node.value, node.frequency, 'black', node.left, node.right)
+
+# The root of the result can be red, and callers that need a black root call blacken()
+def join(left, value, frequency, right):
+    left_height, right_height = black_height(left), black_height(right)
+    if left_height > right_height:
+        node = join_right(left, value, frequency, right, right_height)
+        if node.color == 'red' and is_red(node.right):
+            node = blacken(node)
+        return node
+    if right_height > left_height:
+        node = join_left(left, value, frequency, right, left_height)
+        if node.color == 'red' and is_red(node.left):
+            node = blacken(node)
+        return node
+    color = 'black' if is_red(left) or is_red(right) else 'red'
+    return Node(value, frequency, color, left, right)
+
+# We walk down the right spine of the taller tree to a black node with the same black height as the shorter tree, and hang the new node there
+def join_right(left, value, frequency, right, height):
+    if not is_red(left) and black_height(left) == height:
+        return Node(value, frequency, 'red', left, right)
+    child = join_right(left.right, value, frequency, right, height)
+    if left.color == 'black' and child.color == 'red' and is_red(child.right):
+        # Two red nodes in a row under a black node, which a left rotation and a recoloring fix
+        return Node(child.value, child.frequency, 'red', Node(left.value, left.frequency, 'black', left.left, child.left), blacken(child.right))
+    return Node(left.value, left.frequency, left.color, left.left, child)
+
+def join_left(left, value, frequency, right, height):
+    if not is_red(right) and black_height(right) == height:
+        return Node(value, frequency, 'red', left, right)
+    child = join_left(left, value, frequency, right.left, height)
+    if right.color == 'black' and child.color == 'red' and is_red(child.left):
+        return Node(child.value, child.frequency, 'red', blacken(child.left), Node(right.value, right.frequency, 'black', child.right, right.right))
+    return Node(right.value, right.frequency, right.color, child, right.right)
+
+# We return the values less than the key, the node holding the key (or None), and the values greater than the key
+def split(node, value):
+    if node is None:
+        return None, None, None
+    if value == node.value:
+        return node.left, node, node.right
+    if value < node.value:
+        less, middle, greater = split(node.left, value)
+        return less, middle, join(greater, node.value, node.frequency, node.right)
+    less, middle, greater = split(node.right, value)
+    return join(node.left, node.value, node.frequency, less), middle, greater
+
+# We return the smallest node of a tree and the tree without it
+def split_first(node):
+    if node.left is None:
+        return node, node.right
+    first, rest = split_first(node.left)
+    return first, join(rest, node.value, node.frequency, node.right)
+
+# We join two trees without a pivot by taking the smallest node of the right tree as the pivot
+def join_trees(left, right):
+    if right is None:
+        return left
+    first, rest = split_first(right)
+    return join(left, first.value, first.frequency, rest)
+
+# We copy the path down to the value, and fix two red nodes in a row on the way back up by rebuilding the three nodes involved as a red node with two black children
+def insert(node, value):
+    if node is None:
+        return Node(value, 1, 'red', None, None)
+    if value == node.value:
+        return Node(value, node.frequency + 1, node.color, node.left, node.right)
+    if value < node.value:
+        return balance(node, insert(node.left, value), node.right)
+    return balance(node, node.left, insert(node.right, value))
+
+def balance(node, left, right):
+    if node.color == 'black':
+        if is_red(left):
+            if is_red(left.left):
+                return Node(left.value, left.frequency, 'red', blacken(left.left), Node(node.value, node.frequency, 'black', left.right, right))
+            if is_red(left.right):
+                middle = left.right
+                return Node(middle.value, middle.frequency, 'red', Node(left.value, left.frequency, 'black', left.left, middle.left), Node(node.value, node.frequency, 'black', middle.right, right))
+        if is_red(right):
+            if is_red(right.right):
+                return Node(right.value, right.frequency, 'red', Node(node.value, node.frequency, 'black', left, right.left), blacken(right.right))
+            if is_red(right.left):
+                middle = right.left
+                return Node(middle.value, middle.frequency, 'red', Node(node.value, node.frequency, 'black', left, middle.left), Node(right.value, right.frequency, 'black', middle.right, right.right))
+    return Node(node.value, node.frequency, node.color, left, right)
+
+# A snapshot is a read-only view of one version of the tree, and it is safe to use from any thread without a lock
+class Snapshot:
+    def __init__(self, root):
+        self.root = root
+
+    def search(self, value):
+        current = self.root
+        while current is not None:
+            if value == current.value:
+                return current
+            elif value < current.value:
+                current = current.left
+            else:
+                current = current.right
+        return None
+
+    def __contains__(self, value):
+        return self.search(value) is not None
+
+    def nodes_from(self, value):
+        stack = []
+        current = self.root
+        while current is not None:
+            if value <= current.value:
+                stack.append(current)
+                current = current.left
+            else:
+                current = current.right
+        while stack:
+            node = stack.pop()
+            yield node
+            current = node.right
+            while current is not None:
+                stack.append(current)
+                current = current.left
+
+    # We yield the values v such that lo <= v <= hi in increasing order, repeating each value as many times as it occurs
+    def range(self, lo, hi):
+        for node in self.nodes_from(lo):
+            if node.value > hi:
+                return
+            for _ in range(node.frequency):
+                yield node.value
+
+    def to_list(self):
+        arr = []
+        stack = []
+        current = self.root
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            for _ in range(current.frequency):
+                arr.append(current.value)
+            current = current.right
+        return arr
+
+    # We return the number of nodes and the number of values, like RedBlackTree.size()
+    def size(self):
+        if self.root is None:
+            return (0, 0)
+        return (self.root.node_count, self.root.value_count)
+
+    def __len__(self):
+        return self.root.value_count if self.root is not None else 0
+
+    def height(self):
+        height = 0
+        level = [self.root] if self.root is not None else []
+        while level:
+            height += 1
+            level = [child for node in level for child in (node.left, node.right) if child is not None]
+        return height
+
+class ConcurrentRedBlackTree:
+    def __init__(self, arr=None):
+        self.lock = threading.Lock()
+        self.root = None
+        if arr:
+            self.bulk_load(arr)
+
+    # We collapse each run of equal values into a single node and build the tree bottom-up, like RedBlackTree.bulk_load()
+    def bulk_load(self, arr, presorted=False):
+        if not presorted:
+            arr = sorted(arr)
+        values = []
+        counts = []
+        for value in arr:
+            if values and value == values[-1]:
+                counts[-1] += 1
+            else:
+                values.append(value)
+                counts.append(1)
+        red_depth = len(values).bit_length() - 1
+        root = self._build(values, counts, 0, len(values) - 1, 0, red_depth)
+        with self.lock:
+            self.publish(root)
+
+    def _build(self, values, counts, start, end, depth, red_depth):
+        if start > end:
+            return None
+        mid = (start + end) // 2
+        left = self._build(values, counts, start, mid - 1, depth + 1, red_depth)
+        right = self._build(values, counts, mid + 1, end, depth + 1, red_depth)
+        return Node(values[mid], counts[mid], 'red' if depth == red_depth else 'black', left, right)
+
+    # The new root is stored last, so readers switch from the old version to the new one in a single step
+    def publish(self, root):
+        if is_red(root):
+            root = blacken(root)
+        self.root = root
+
+    def insert(self, value):
+        with self.lock:
+            self.publish(self._insert(self.root, value))
+
+    def delete(self, value):
+        with self.lock:
+            self.publish(self._delete(self.root, value))
+
+    # We apply a batch of inserts and deletes and publish them together, so a reader sees all of them or none of them
+    def apply(self, insertions=(), deletions=()):
+        with self.lock:
+            root = self.root
+            for value in insertions:
+                root = self._insert(root, value)
+            for value in deletions:
+                root = self._delete(root, value)
+            self.publish(root)
+
+    # insert() and join() can leave a red root, and balance() only repairs two reds in a row under a black node
+    # So we blacken the root after every change, or the next change of a batch in apply() would build on a red root and break the black heights
+    def _insert(self, root, value):
+        root = insert(root, value)
+        return blacken(root) if is_red(root) else root
+
+    # Like RedBlackTree.delete(), we remove every occurrence of the value
+    def _delete(self, root, value):
+        if Snapshot(root).search(value) is None:
+            return root
+        less, middle, greater = split(root, value)
+        root = join_trees(less, greater)
+        return blacken(root) if is_red(root) else root
+
+    # A reader takes a snapshot once and then reads from it without any locking
+    def snapshot(self):
+        return Snapshot(self.root)
+
+    def search(self, value):
+        return self.snapshot().search(value)
+
+    def range(self, lo, hi):
+        return self.snapshot().range(lo, hi)
+
+    def to_list(self):
+        return self.snapshot().to_list()
+
+    def size(self):
+        return self.snapshot().size()
+
+    def height(self):
+        return self.snapshot().height()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='concurrentredblacktree.py', description='Concurrent red black tree')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-i', '--inputfile', type=str)
+    group.add_argument('-n', '--numbers', nargs='+', type=int)
+    group.add_argument('-r', '--random', action='store_true')
+    parser.add_argument('-s', '--size', type=float, default=10)
+    parser.add_argument('-min', '--minimum', type=float, default=0)
+    parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
+    parser.add_argument('-t', '--test', nargs='+', type=int)
+    args = parser.parse_args()
+    if args.inputfile:
+        arr = dataio.read(args.inputfile, args.format)
+    elif args.numbers:
+        arr = args.numbers
+    elif args.random:
+        size, min, max = int(args.size), int(args.minimum), int(args.maximum)
+        arr = [random.randint(min, max) for i in range(size)]
+    tree = ConcurrentRedBlackTree(arr)
+    snapshot = tree.snapshot()
+    root_value = snapshot.root.value if snapshot.root else None
+    node_count, value_count = snapshot.size()
+    print('Statistics')
+    print('------------------------------')
+    print(f'Root value: {root_value} Node count: {node_count} Value count: {value_count} Height: {snapshot.height()}')
+    print('')
+    if args.test:
+        print('Search results')
+        print('------------------------------')
+        for value in args.test:
+            print(f'{value} is present' if snapshot.search(value) else f'{value} is missing')
@@ -0,0 +1,133 @@
+# ###### Introduction ######
+#
+# This file sorts a file of numbers that is too large to fit in memory
+#
+# quicksort.py reads the whole file with ast.literal_eval and sorts the list in memory, so the file has to fit in memory several times over
+#
+# An external sort only keeps a bounded number of values in memory at once, and it has two phases
+#
+# 1. We read the input file as a stream (with dataio.iterate), and cut it into runs of m values (the run size)
+#    We sort every run with quicksort and write it to a temporary file as raw 64-bit integers or floats (array.tofile)
+# 2. We merge the sorted runs with a heap (heapq.merge), which repeatedly takes the smallest of the next values of every run
+#    Every run is read through a buffer of b values, so the merge holds k * b values in memory for k runs
+#
+# If there are more runs than the fan-in, we merge them in groups of fan-in runs into longer runs, and repeat until there are few enough runs for the last merge
+#
+# Every extra pass reads and writes the whole file once more, but it keeps the number of open files and buffers bounded
+#
+# The input and the output can be in any of the formats of dataio.py (a Python list, one number per line, or raw 64-bit numbers)
+# The numbers must all be integers or all be floats, because the runs are stored as 64-bit integers or floats
+#
+# ###### Examples ######
+#
+# Example 1: Sort a large file with runs of 10 million values
+#
+# % python externalsort.py -i unsorted.txt -o sorted.txt -m 1e7
+#
+# Example 2: Merge at most 4 runs at a time, and keep the runs on another disk
+#
+# % python externalsort.py -i unsorted.txt -o sorted.txt -m 1e6 -k 4 -t /mnt/scratch
+#
+# Example 3: The same thing with quicksort.py
+#
+# % python quicksort.py -i unsorted.txt -o sorted.txt -e -m 1e6
+
+import array
+import heapq
+import itertools
+import os
+import tempfile
+import time
+import argparse
+import dataio
+import quicksort
+import parallelsort
+
+# The number of values in a run
+RUN_SIZE = 1000000
+
+# The number of runs that are merged at once
+FAN_IN = 16
+
+# The number of values that are read from a run, or written to a file, at once
+BUFFER_SIZE = 8192
+
+def write_run(path, values, typecode, buffer_size=BUFFER_SIZE):
+    with open(path, 'wb') as file:
+        dataio.write_binary(file, values, typecode, buffer_size)
+
+def read_run(path, typecode, buffer_size=BUFFER_SIZE):
+    with open(path, 'rb') as file:
+        yield from dataio.read_binary(file, typecode, buffer_size)
+
+# We return the typecode of the runs, and the paths of the runs
+# We check the type of every value, because array.array('d', ...) would silently turn the integers of a mixed run into floats
+def create_runs(values, directory, run_size, partitioning):
+    typecode = None
+    paths = []
+    while True:
+        run = list(itertools.islice(values, run_size))
+        if not run:
+            return typecode, paths
+        run_typecode = parallelsort.typecode_of(run)
+        if run_typecode is None or (typecode is not None and run_typecode != typecode):
+            raise ValueError('The values must all be integers or all be floats that fit in 64 bits')
+        typecode = run_typecode
+        quicksort.quicksort(run, 0, len(run) - 1, partitioning)
+        try:
+            run = array.array(typecode, run)
+        except OverflowError:
+            raise ValueError('The values must all be integers or all be floats that fit in 64 bits')
+        path = os.path.join(directory, f'run{len(paths)}.bin')
+        write_run(path, run, typecode)
+        paths.append(path)
+
+# We merge the runs in groups of fan_in runs until there are at most fan_in runs left, and return the remaining runs and the number of passes
+def merge_runs(paths, typecode, directory, fan_in, buffer_size):
+    passes = 0
+    while len(paths) > fan_in:
+        merged = []
+        for i in range(0, len(paths), fan_in):
+            group = paths[i:i + fan_in]
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            path = os.path.join(directory, f'pass{passes}run{len(merged)}.bin')
+            write_run(path, heapq.merge(*[read_run(run, typecode, buffer_size) for run in group]), typecode, buffer_size)
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        paths = merged
+        passes += 1
+    return paths, passes
+
+# We return the number of values, the number of runs, and the number of merge passes
+# The formats are the formats of dataio.py, and they are detected like dataio.read() and dataio.write() detect them
+def external_sort(inputfile, outputfile, run_size=RUN_SIZE, fan_in=FAN_IN, buffer_size=BUFFER_SIZE, tempdir=None, partitioning='auto', input_format=None, output_format=None):
+    if fan_in < 2:
+        raise ValueError('The fan-in must be at least 2')
+    with tempfile.TemporaryDirectory(dir=tempdir) as directory:
+        typecode, paths = create_runs(dataio.iterate(inputfile, input_format, buffer_size=buffer_size), directory, run_size, partitioning)
+        count = sum(os.path.getsize(path) for path in paths) // 8
+        run_count = len(paths)
+        paths, passes = merge_runs(paths, typecode, directory, fan_in, buffer_size)
+        dataio.write(outputfile, heapq.merge(*[read_run(path, typecode, buffer_size) for path in paths]), output_format)
+    return count, run_count, passes + 1
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='externalsort.py', description='Sort a file that is larger than memory')
+    parser.add_argument('-i', '--inputfile', type=str, required=True)
+    parser.add_argument('-o', '--outputfile', type=str, required=True)
+    parser.add_argument('-m', '--run-size', type=float, default=RUN_SIZE)
+    parser.add_argument('-k', '--fan-in', type=int, default=FAN_IN)
+    parser.add_argument('-b', '--buffer-size', type=float, default=BUFFER_SIZE)
+    parser.add_argument('-t', '--tempdir', type=str)
+    parser.add_argument('-p', '--partition', choices=quicksort.PARTITIONS, default='auto')
+    parser.add_argument('--format', choices=dataio.FORMATS)
+    parser.add_argument('--output-format', choices=dataio.FORMATS)
+    args = parser.parse_args()
+    start_time = time.perf_counter()
+    count, run_count, passes = external_sort(args.inputfile, args.outputfile, int(args.run_size), args.fan_in, int(args.buffer_size), args.tempdir, args.partition, args.format, args.output_format)
+    time_elapsed = 1000 * (time.perf_counter() - start_time)
+    print(f'Sorted {count} values in {run_count} runs and {passes} merge passes')
+    print(f'The external sort completed in {time_elapsed:.4f} milliseconds')
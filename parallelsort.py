@@ -0,0 +1,188 @@
+# ###### Introduction ######
+#
+# This file sorts a list of integers or floats with several processes at once
+#
+# Python threads can't run Python code at the same time, so we use a pool of processes instead
+#
+# Sending a list of numbers to another process means pickling every number, which can take longer than sorting them
+#
+# So we copy the numbers into a block of shared memory (multiprocessing.shared_memory) as 64-bit integers or floats, and every process reads and writes that block directly
+#
+# The only things that get pickled are the name of the block, a few positions, and the splitters
+#
+# The sort is a sample sort, and it has four steps
+#
+# 1. We sort a random sample of the numbers and pick w - 1 splitters from it, which divide the numbers into w buckets of about the same size (w is the number of workers)
+# 2. Every worker counts how many numbers of its chunk of the input fall into each bucket
+# 3. From the counts we know where every bucket starts in the output, and where every chunk's share of every bucket starts, so every worker copies its chunk into the output without locks
+# 4. Every worker sorts one bucket of the output with quicksort, and since the buckets are already in order, the output is sorted
+#
+# Lists of fewer than 100,000 numbers are sorted in this process, because starting the workers takes longer than the sort
+#
+# The buckets are only as even as the splitters, so a list where one value makes up most of the numbers ends up mostly in one bucket
+#
+# ###### Examples ######
+#
+# Example 1: Sort ten million random integers with 8 workers and write them to a file
+#
+# % python parallelsort.py -r -s 1e7 -min 0 -max 1e9 -j 8 -o sorted.txt
+#
+# Example 2: Sort a file of numbers with quicksort.py and 8 workers
+#
+# % python quicksort.py -i unsorted.txt -j 8 -o sorted.txt
+#
+# Example 3: The same thing in Python
+#
+# >>> parallelsort.parallel_quicksort(arr, 8)
+
+import array
+import bisect
+import os
+import random
+import time
+import argparse
+import dataio
+import multiprocessing
+from multiprocessing import shared_memory
+import quicksort
+
+# Lists smaller than this are sorted in this process
+PARALLEL_CUTOFF = 100000
+
+# We sample this many numbers per bucket to choose the splitters
+OVERSAMPLING = 64
+
+# We return a view of the numbers in positions start to end of a block of shared memory
+def attach(name, typecode, start, end):
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, memory.buf[8 * start:8 * end].cast(typecode)
+
+def detach(memory, view):
+    view.release()
+    memory.close()
+
+def count_buckets(task):
+    name, typecode, start, end, splitters = task
+    memory, values = attach(name, typecode, start, end)
+    counts = [0] * (len(splitters) + 1)
+    bisect_right = bisect.bisect_right
+    for value in values:
+        counts[bisect_right(splitters, value)] += 1
+    detach(memory, values)
+    return counts
+
+# We gather the chunk into one list per bucket, and then copy each list into the output with a single slice assignment
+def scatter(task):
+    input_name, output_name, typecode, start, end, splitters, offsets, count = task
+    memory, values = attach(input_name, typecode, start, end)
+    buckets = [[] for _ in range(len(splitters) + 1)]
+    bisect_right = bisect.bisect_right
+    for value in values:
+        buckets[bisect_right(splitters, value)].append(value)
+    detach(memory, values)
+    memory, output = attach(output_name, typecode, 0, count)
+    for bucket, offset in zip(buckets, offsets):
+        output[offset:offset + len(bucket)] = array.array(typecode, bucket)
+    detach(memory, output)
+
+def sort_bucket(task):
+    name, typecode, start, end, partitioning = task
+    memory, values = attach(name, typecode, start, end)
+    arr = values.tolist()
+    quicksort.quicksort(arr, 0, len(arr) - 1, partitioning)
+    values[:] = array.array(typecode, arr)
+    detach(memory, values)
+
+# We return 'q' if every value is an int, 'd' if every value is a float, and None for anything else, including a mix of the two
+# We check every value, because array.array('d', ...) would silently turn the ints of a mixed list into floats
+def typecode_of(arr):
+    if isinstance(arr, (array.array, memoryview)):
+        typecode = arr.typecode if isinstance(arr, array.array) else arr.format
+        return typecode if typecode in ('q', 'd') else None
+    kinds = set(map(type, arr))
+    if kinds == {int}:
+        return 'q'
+    if kinds == {float}:
+        return 'd'
+    return None
+
+def choose_splitters(arr, bucket_count):
+    sample = sorted(random.sample(arr, bucket_count * OVERSAMPLING if bucket_count * OVERSAMPLING < len(arr) else len(arr)))
+    return [sample[i * len(sample) // bucket_count] for i in range(1, bucket_count)]
+
+# We sort the list in place, like quicksort.quicksort(arr, 0, len(arr) - 1)
+# Lists that aren't all ints that fit in 64 bits or all floats are sorted in this process
+def parallel_quicksort(arr, workers=None, partitioning='auto'):
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(arr) < PARALLEL_CUTOFF:
+        quicksort.quicksort(arr, 0, len(arr) - 1, partitioning)
+        return
+    typecode = typecode_of(arr)
+    try:
+        values = array.array(typecode, arr) if typecode else None
+    except OverflowError:
+        values = None
+    if values is None:
+        quicksort.quicksort(arr, 0, len(arr) - 1, partitioning)
+        return
+    count = len(values)
+    splitters = choose_splitters(arr, workers)
+    chunks = [(i * count // workers, (i + 1) * count // workers) for i in range(workers)]
+    input_memory = shared_memory.SharedMemory(create=True, size=8 * count)
+    output_memory = shared_memory.SharedMemory(create=True, size=8 * count)
+    try:
+        view = input_memory.buf[:8 * count].cast(typecode)
+        view[:] = values
+        view.release()
+        del values
+        with multiprocessing.Pool(workers) as pool:
+            counts = pool.map(count_buckets, [(input_memory.name, typecode, start, end, splitters) for start, end in chunks])
+            # bounds[b] is where bucket b starts in the output, and offsets[c][b] is where chunk c writes its share of bucket b
+            bounds = [0]
+            offsets = [[0] * workers for _ in chunks]
+            for bucket in range(workers):
+                for chunk in range(len(chunks)):
+                    offsets[chunk][bucket] = bounds[-1] + sum(counts[previous][bucket] for previous in range(chunk))
+                bounds.append(bounds[-1] + sum(counts[chunk][bucket] for chunk in range(len(chunks))))
+            pool.map(scatter, [(input_memory.name, output_memory.name, typecode, start, end, splitters, offsets[chunk], count) for chunk, (start, end) in enumerate(chunks)])
+            pool.map(sort_bucket, [(output_memory.name, typecode, bounds[bucket], bounds[bucket + 1], partitioning) for bucket in range(workers)])
+        view = output_memory.buf[:8 * count].cast(typecode)
+        # A memoryview (from dataio.read) can only take its values from another buffer
+        arr[:] = view if isinstance(arr, memoryview) else view.tolist()
+        view.release()
+    finally:
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='parallelsort.py', description='Sort a list with several processes')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-i', '--inputfile', type=str)
+    group.add_argument('-n', '--numbers', nargs='+', type=int)
+    group.add_argument('-r', '--random', action='store_true')
+    parser.add_argument('-s', '--size', type=float, default=10)
+    parser.add_argument('-min', '--minimum', type=float, default=0)
+    parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
+    parser.add_argument('-o', '--outputfile', type=str)
+    parser.add_argument('--output-format', choices=dataio.FORMATS)
+    parser.add_argument('-j', '--workers', type=int)
+    parser.add_argument('-p', '--partition', choices=quicksort.PARTITIONS, default='auto')
+    args = parser.parse_args()
+    if args.inputfile:
+        arr = dataio.read(args.inputfile, args.format)
+    elif args.numbers:
+        arr = args.numbers
+    elif args.random:
+        size, min, max = int(args.size), int(args.minimum), int(args.maximum)
+        arr = [random.randint(min, max) for i in range(size)]
+    start_time = time.perf_counter()
+    parallel_quicksort(arr, args.workers, args.partition)
+    time_elapsed = 1000 * (time.perf_counter() - start_time)
+    if args.outputfile:
+        dataio.write(args.outputfile, arr, args.output_format)
+    else:
+        print(f'Sorted list:\n{list(arr)}\n')
+    print(f'The parallel sort completed in {time_elapsed:.4f} milliseconds')
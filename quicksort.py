@@ -29,6 +29,64 @@
 # It is really rewarding to learn more about algorithms and data structures
 # Algorithms and data structures are an essential part of computer science
 #
+# ###### Introsort ######
+#
+# The simplest quicksort uses the last element as the pivot
+# That works well on random data, but on sorted or reversed data the last element is always the largest or the smallest,
+# so every partition only removes one element, the sort takes O(n^2) time, and the recursion goes n levels deep
+#
+# So the quicksort function in this file is really an introsort (introspective sort), which makes four changes
+#
+# 1. The pivot is the median of three elements (the first, the middle and the last), or for large ranges the median of three medians of three (a ninther)
+# 2. Ranges of 16 elements or fewer are sorted with insertion sort, which is faster than quicksort on small ranges
+# 3. We only recurse into the smaller side of each partition, and loop on the larger side, so the recursion is at most log2(n) levels deep
+# 4. If the partitions go more than 2 * log2(n) levels deep, we sort the rest of the range with heapsort, which guarantees O(n log n) time
+#
+# ###### Three-way partitioning ######
+#
+# The partition function puts every element that is equal to the pivot on the right side of the pivot
+# So if a list only has a few distinct values, like the list in example #2, the same values get partitioned over and over again
+#
+# The partition3 function splits a range into three bands: the elements less than the pivot, the elements equal to the pivot, and the elements greater than the pivot
+# The middle band is already in its final place, so we only sort the other two bands, and a list with k distinct values takes O(n log k) time
+#
+# Three-way partitioning does more swaps than two-way partitioning, so it is slower on lists where every value is distinct
+#
+# By default quicksort samples 128 elements of the list, and it uses three-way partitioning if at least 1 in 16 of the sampled elements is a duplicate
+# The -p option lets you choose the partitioning yourself
+#
+# ###### NumPy ######
+#
+# On a list of numbers almost all of the time goes into the Python loop of the partition function, one comparison and one swap at a time
+#
+# If NumPy is installed, quicksort copies a list of integers or floats into a NumPy array (or, for an array or a memoryview, uses its memory directly)
+# Then every range of more than 256 elements is partitioned with vectorized comparisons: we build masks of the elements less than and greater than the pivot, and gather the three bands in one step
+# Gathering the bands is a three-way partition, so runs of equal keys are finished as soon as one of them is the pivot
+# Smaller ranges are copied into a list and sorted with the Python code, because a few NumPy calls cost more than the Python loop on a few hundred elements
+#
+# Lists of other values, lists that mix integers and floats, integers that don't fit in 64 bits, and floats that include NaN are sorted in pure Python, and so is everything if NumPy is not installed
+# The -b option lets you choose the backend yourself
+#
+# ###### Selection ######
+#
+# Often we only need the median, a few percentiles, or the 100 smallest values, and sorting the whole list for them takes O(n log n) time
+#
+# Quickselect partitions the list like quicksort, but it only continues into the side that holds the position we want, so it takes O(n) time on average
+#
+# The select function is an introselect: if the partitions go more than 2 * log2(n) levels deep, it chooses its pivots with the median of medians,
+# which splits the elements into groups of five and uses the median of the group medians, and that guarantees O(n) time in the worst case
+#
+# On top of select there are nsmallest, nlargest, partial_sort (sort only the first k positions) and percentiles
+#
+# ###### Parallel sorting ######
+#
+# The -j option sorts the list with several processes, using the sample sort in parallelsort.py
+#
+# ###### External sorting ######
+#
+# The -e option sorts a file that is larger than memory, using the external sort in externalsort.py
+# The file is sorted in runs of -m values, which are merged into the output file, so -e needs both -i and -o
+#
 # ###### Examples ######
 #
 # Example #1:
@@ -71,11 +129,65 @@
 #
 # % cat sorted.txt
 # [0, 0, 1, 6, 6, 7, 8, 8, 9, 10]
+#
+# Example #5:
+#
+# % python quicksort.py -i unsorted.txt -p three-way
+# Sorted list:
+# [0, 0, 1, 6, 6, 7, 8, 8, 9, 10]
+#
+# The quicksort algorithm completed in 0.0110 milliseconds
+#
+# Example #6:
+#
+# % python quicksort.py -i unsorted.txt -j 8 -o sorted.txt
+# The quicksort algorithm completed in 0.0093 milliseconds
+#
+# Example #7:
+#
+# % python quicksort.py -i unsorted.txt -o sorted.txt -e -m 1e6
+# Sorted 10 values in 1 runs and 1 merge passes
+# The quicksort algorithm completed in 0.6103 milliseconds
+#
+# Example #8:
+#
+# The input and output files can be Python lists, one number per line, or raw 64-bit integers or floats (see dataio.py)
+#
+# % python dataio.py -i unsorted.txt -o unsorted.i64
+# % python quicksort.py -i unsorted.i64 -o sorted.txt --output-format lines
+# The quicksort algorithm completed in 0.0104 milliseconds
+#
+# Example #9:
+#
+# % python quicksort.py -i unsorted.txt --percentiles 50 90 99
+# Percentiles:
+# 50: 6.5
+# 90: 9.1
+# 99: 9.91
+#
+# The select algorithm completed in 0.1114 milliseconds
+#
+# Example #10:
+#
+# % python quicksort.py -i unsorted.txt --nlargest 3
+# Largest 3 values:
+# [10, 9, 8]
+#
+# The select algorithm completed in 0.0211 milliseconds
 
+import array
 import random
+import sys
 import time
 import argparse
-import ast
+import dataio
+import parallelsort
+import externalsort
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 def partition(arr, low, high):
     pivot = arr[high]
@@ -90,11 +202,291 @@ def partition(arr, low, high):
 def swap(arr, i, j):
     arr[i], arr[j] = arr[j], arr[i]
 
-def quicksort(arr, low, high):
+# Ranges of this many elements or fewer are sorted with insertion sort
+INSERTION_SORT_CUTOFF = 16
+
+# Ranges of more than this many elements use a ninther instead of a median of three
+NINTHER_CUTOFF = 128
+
+# We sample this many elements to decide whether a list has enough duplicates for three-way partitioning
+DUPLICATE_SAMPLE_SIZE = 128
+
+# We use three-way partitioning if at least 1 in this many sampled elements is a duplicate
+DUPLICATE_RATIO = 16
+
+PARTITIONS = ['auto', 'two-way', 'three-way']
+
+# Ranges of more than this many elements are partitioned with NumPy
+NUMPY_CUTOFF = 256
+
+BACKENDS = ['auto', 'python', 'numpy']
+
+# We return (lt, gt), where arr[low..lt-1] < pivot, arr[lt..gt] == pivot and arr[gt+1..high] > pivot
+def partition3(arr, low, high):
+    pivot = arr[high]
+    lt, i, gt = low, low, high
+    while i <= gt:
+        if arr[i] < pivot:
+            swap(arr, lt, i)
+            lt += 1
+            i += 1
+        elif pivot < arr[i]:
+            swap(arr, i, gt)
+            gt -= 1
+        else:
+            i += 1
+    return lt, gt
+
+# We sample evenly spaced elements, so the decision is the same every time we sort the same list
+def has_many_duplicates(arr, low, high):
+    size = high - low + 1
+    step = size // DUPLICATE_SAMPLE_SIZE or 1
+    sample = [arr[i] for i in range(low, high + 1, step)][:DUPLICATE_SAMPLE_SIZE]
+    try:
+        distinct = len(set(sample))
+    except TypeError:
+        return False
+    return (len(sample) - distinct) * DUPLICATE_RATIO >= len(sample)
+
+def quicksort(arr, low, high, partitioning='auto', backend='auto'):
+    if partitioning not in PARTITIONS:
+        raise ValueError(f'Unknown partitioning {partitioning}')
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend}')
+    if backend == 'numpy' and numpy is None:
+        raise ImportError('backend numpy requires NumPy')
+    if low < high:
+        if partitioning == 'auto':
+            three_way = has_many_duplicates(arr, low, high)
+        else:
+            three_way = partitioning == 'three-way'
+        depth_limit = 2 * ((high - low + 1).bit_length() - 1)
+        values = None
+        if backend == 'numpy' or backend == 'auto' and numpy is not None and high - low + 1 > NUMPY_CUTOFF:
+            values = numpy_values(arr, low, high)
+        if values is None:
+            if backend == 'numpy':
+                raise ValueError('backend numpy requires 64-bit integers or floats')
+            introsort(arr, low, high, depth_limit, three_way)
+        elif isinstance(arr, list):
+            numpy_introsort(values, 0, high - low, depth_limit, three_way)
+            arr[low:high + 1] = values.tolist()
+        else:
+            numpy_introsort(values, low, high, depth_limit, three_way)
+
+# We return a NumPy array of arr, or None if arr can't be sorted with NumPy without changing its values
+# An array or a memoryview shares its memory with the NumPy array, and a list is copied from low to high
+def numpy_values(arr, low, high):
+    if isinstance(arr, list):
+        kinds = set(map(type, arr[low:high + 1]))
+        if kinds != {int} and kinds != {float}:
+            return None
+        # We ask for int64 explicitly, because NumPy would otherwise turn a mix of negative integers and integers of 2**63 or more into rounded floats
+        try:
+            values = numpy.array(arr[low:high + 1], dtype=numpy.int64 if kinds == {int} else numpy.float64)
+        except OverflowError:
+            return None
+        segment = values
+    elif isinstance(arr, array.array) and arr.typecode in ('q', 'd') or isinstance(arr, memoryview) and arr.format in ('q', 'd') and not arr.readonly:
+        values = numpy.asarray(arr)
+        segment = values[low:high + 1]
+    else:
+        return None
+    if values.dtype != numpy.int64 and values.dtype != numpy.float64:
+        return None
+    if values.dtype.kind == 'f' and numpy.isnan(segment).any():
+        return None
+    return values
+
+# Like introsort(), but every range of more than NUMPY_CUTOFF elements is partitioned three ways at once with boolean masks
+def numpy_introsort(values, low, high, depth_limit, three_way):
+    while high - low + 1 > NUMPY_CUTOFF and depth_limit > 0:
+        depth_limit -= 1
+        pivot = values[choose_pivot(values, low, high)]
+        segment = values[low:high + 1]
+        less = segment < pivot
+        greater = segment > pivot
+        # We copy the bands before we write them back, because segment is a view of values
+        segment[:] = numpy.concatenate((segment[less], segment[~(less | greater)], segment[greater]))
+        lt = low + int(numpy.count_nonzero(less))
+        gt = high - int(numpy.count_nonzero(greater))
+        if lt - low < high - gt:
+            numpy_introsort(values, low, lt - 1, depth_limit, three_way)
+            low = gt + 1
+        else:
+            numpy_introsort(values, gt + 1, high, depth_limit, three_way)
+            high = lt - 1
     if low < high:
-        pivot_index = partition(arr, low, high)
-        quicksort(arr, low, pivot_index - 1)
-        quicksort(arr, pivot_index + 1, high)
+        arr = values[low:high + 1].tolist()
+        introsort(arr, 0, len(arr) - 1, depth_limit, three_way)
+        values[low:high + 1] = arr
+
+def introsort(arr, low, high, depth_limit, three_way=False):
+    while high - low + 1 > INSERTION_SORT_CUTOFF:
+        if depth_limit == 0:
+            heapsort(arr, low, high)
+            return
+        depth_limit -= 1
+        # partition() and partition3() use the last element as the pivot, so we move the chosen pivot there first
+        swap(arr, choose_pivot(arr, low, high), high)
+        if three_way:
+            lt, gt = partition3(arr, low, high)
+        else:
+            lt = gt = partition(arr, low, high)
+        if lt - low < high - gt:
+            introsort(arr, low, lt - 1, depth_limit, three_way)
+            low = gt + 1
+        else:
+            introsort(arr, gt + 1, high, depth_limit, three_way)
+            high = lt - 1
+    insertion_sort(arr, low, high)
+
+def choose_pivot(arr, low, high):
+    mid = (low + high) // 2
+    if high - low + 1 > NINTHER_CUTOFF:
+        step = (high - low + 1) // 8
+        first = median_of_three(arr, low, low + step, low + 2 * step)
+        second = median_of_three(arr, mid - step, mid, mid + step)
+        third = median_of_three(arr, high - 2 * step, high - step, high)
+        return median_of_three(arr, first, second, third)
+    return median_of_three(arr, low, mid, high)
+
+# We return the index of the median of arr[a], arr[b] and arr[c]
+def median_of_three(arr, a, b, c):
+    if arr[a] < arr[b]:
+        if arr[b] < arr[c]:
+            return b
+        return c if arr[a] < arr[c] else a
+    if arr[a] < arr[c]:
+        return a
+    return c if arr[b] < arr[c] else b
+
+def insertion_sort(arr, low, high):
+    for i in range(low + 1, high + 1):
+        value = arr[i]
+        j = i - 1
+        while j >= low and value < arr[j]:
+            arr[j + 1] = arr[j]
+            j -= 1
+        arr[j + 1] = value
+
+# We build a max heap in arr[low..high], where the children of low + i are low + 2i + 1 and low + 2i + 2, and then move the maximum to the end of the range one element at a time
+def heapsort(arr, low, high):
+    size = high - low + 1
+    for i in range(size // 2 - 1, -1, -1):
+        sift_down(arr, low, i, size)
+    for end in range(size - 1, 0, -1):
+        swap(arr, low, low + end)
+        sift_down(arr, low, 0, end)
+
+def sift_down(arr, low, i, size):
+    value = arr[low + i]
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        if child + 1 < size and arr[low + child] < arr[low + child + 1]:
+            child += 1
+        if not value < arr[low + child]:
+            break
+        arr[low + i] = arr[low + child]
+        i = child
+    arr[low + i] = value
+
+# We rearrange arr[low..high] so that arr[k] is the value that would be there if the range were sorted, every value before it is less than or equal to it, and every value after it is greater than or equal to it
+def select(arr, k, low=0, high=None):
+    if high is None:
+        high = len(arr) - 1
+    if not low <= k <= high:
+        raise IndexError(f'{k} is out of range')
+    three_way = has_many_duplicates(arr, low, high)
+    depth_limit = 2 * ((high - low + 1).bit_length() - 1)
+    while high - low + 1 > INSERTION_SORT_CUTOFF:
+        if depth_limit > 0:
+            depth_limit -= 1
+            pivot_index = choose_pivot(arr, low, high)
+        else:
+            pivot_index = median_of_medians(arr, low, high)
+        swap(arr, pivot_index, high)
+        # The median of medians only guarantees linear time if equal values can't all end up on one side, so it always partitions three ways
+        if three_way or depth_limit == 0:
+            lt, gt = partition3(arr, low, high)
+        else:
+            lt = gt = partition(arr, low, high)
+        if k < lt:
+            high = lt - 1
+        elif k > gt:
+            low = gt + 1
+        else:
+            return arr[k]
+    insertion_sort(arr, low, high)
+    return arr[k]
+
+# We sort every group of five elements, move the median of every group to the front of the range, and return the index of the median of those medians
+def median_of_medians(arr, low, high):
+    count = 0
+    for start in range(low, high + 1, 5):
+        end = start + 4 if start + 4 <= high else high
+        insertion_sort(arr, start, end)
+        swap(arr, low + count, (start + end) // 2)
+        count += 1
+    mid = low + (count - 1) // 2
+    select(arr, mid, low, low + count - 1)
+    return mid
+
+# We return the k smallest values in increasing order, without changing arr
+def nsmallest(arr, k):
+    arr = list(arr)
+    if k <= 0:
+        return []
+    if k < len(arr):
+        select(arr, k - 1)
+        del arr[k:]
+    quicksort(arr, 0, len(arr) - 1)
+    return arr
+
+# We return the k largest values in decreasing order, without changing arr
+def nlargest(arr, k):
+    arr = list(arr)
+    if k <= 0:
+        return []
+    if k < len(arr):
+        select(arr, len(arr) - k)
+        del arr[:len(arr) - k]
+    quicksort(arr, 0, len(arr) - 1)
+    arr.reverse()
+    return arr
+
+# We sort arr in place so that arr[0..k-1] holds the k smallest values in increasing order, and the rest of arr holds the other values in no particular order
+def partial_sort(arr, k):
+    if k <= 0:
+        return
+    if k < len(arr):
+        select(arr, k - 1)
+    quicksort(arr, 0, (k if k < len(arr) else len(arr)) - 1)
+
+# We return the percentiles of arr in the order they are given, interpolating linearly between the two closest values like numpy.percentile
+# The percentiles are selected in increasing order, and every select only searches the part of the list to the right of the previous one
+def percentiles(arr, ps):
+    arr = list(arr)
+    if not arr:
+        raise ValueError('The list is empty')
+    results = {}
+    low = 0
+    for p in sorted(set(ps)):
+        if not 0 <= p <= 100:
+            raise ValueError(f'{p} is not between 0 and 100')
+        position = p / 100 * (len(arr) - 1)
+        index = int(position)
+        lower = select(arr, index, low)
+        low = index
+        if position > index:
+            # The smallest value to the right of arr[index] is the next value in sorted order
+            upper = select(arr, index + 1, index + 1)
+            results[p] = lower + (upper - lower) * (position - index)
+        else:
+            results[p] = lower
+    return [results[p] for p in ps]
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(prog='quicksort.py', description='Sort a list')
@@ -105,12 +497,32 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--size', type=float, default=10)
     parser.add_argument('-min', '--minimum', type=float, default=0)
     parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
     parser.add_argument('-o', '--outputfile', type=str)
+    parser.add_argument('--output-format', choices=dataio.FORMATS)
+    parser.add_argument('-p', '--partition', choices=PARTITIONS, default='auto')
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default='auto')
+    parser.add_argument('-j', '--workers', type=int, default=1)
+    parser.add_argument('-e', '--external', action='store_true')
+    parser.add_argument('-m', '--run-size', type=float, default=externalsort.RUN_SIZE)
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('-k', '--select', type=int)
+    selection.add_argument('--nsmallest', type=int)
+    selection.add_argument('--nlargest', type=int)
+    selection.add_argument('--partial', type=int)
+    selection.add_argument('--percentiles', nargs='+', type=float)
     args = parser.parse_args()
+    if args.external:
+        if not args.inputfile or not args.outputfile:
+            parser.error('-e requires -i and -o')
+        start_time = time.perf_counter()
+        count, run_count, passes = externalsort.external_sort(args.inputfile, args.outputfile, int(args.run_size), partitioning=args.partition, input_format=args.format, output_format=args.output_format)
+        time_elapsed = 1000 * (time.perf_counter() - start_time)
+        print(f'Sorted {count} values in {run_count} runs and {passes} merge passes')
+        print(f'The quicksort algorithm completed in {time_elapsed:.4f} milliseconds')
+        sys.exit(0)
     if args.inputfile:
-        with open(args.inputfile, 'r') as file:
-            contents = file.read()
-            arr = ast.literal_eval(contents)
+        arr = dataio.read(args.inputfile, args.format)
     elif args.numbers:
         arr = args.numbers
         print(f'Unsorted list:\n{arr}\n')
@@ -120,12 +532,41 @@ if __name__ == '__main__':
         for i in range(0, size):
             arr.append(random.randint(min, max))
         print(f'Randomly generated list:\n{arr}\n')
-    start_time = time.time()
-    quicksort(arr, 0, len(arr) - 1)
-    time_elapsed = 1000 * (time.time() - start_time)
+    if args.select is not None or args.nsmallest is not None or args.nlargest is not None or args.percentiles:
+        start_time = time.perf_counter()
+        if args.select is not None:
+            value = select(arr, args.select)
+        elif args.nsmallest is not None:
+            values = nsmallest(arr, args.nsmallest)
+        elif args.nlargest is not None:
+            values = nlargest(arr, args.nlargest)
+        else:
+            values = percentiles(arr, args.percentiles)
+        time_elapsed = 1000 * (time.perf_counter() - start_time)
+        if args.select is not None:
+            print(f'The value at index {args.select} of the sorted list is {value}\n')
+        elif args.percentiles:
+            print('Percentiles:')
+            for p, value in zip(args.percentiles, values):
+                print(f'{p:g}: {value:g}' if isinstance(value, float) else f'{p:g}: {value}')
+            print('')
+        elif args.outputfile:
+            dataio.write(args.outputfile, values, args.output_format)
+        else:
+            print(f'Smallest {len(values)} values:' if args.nsmallest is not None else f'Largest {len(values)} values:')
+            print(f'{values}\n')
+        print(f'The select algorithm completed in {time_elapsed:.4f} milliseconds')
+        sys.exit(0)
+    start_time = time.perf_counter()
+    if args.partial is not None:
+        partial_sort(arr, args.partial)
+    elif args.workers > 1:
+        parallelsort.parallel_quicksort(arr, args.workers, args.partition)
+    else:
+        quicksort(arr, 0, len(arr) - 1, args.partition, args.backend)
+    time_elapsed = 1000 * (time.perf_counter() - start_time)
     if args.outputfile:
-        with open(args.outputfile, 'w') as file:
-            file.write(f'{arr}')
+        dataio.write(args.outputfile, arr, args.output_format)
     else:
-        print(f'Sorted list:\n{arr}\n')
+        print(f'Sorted list:\n{list(arr)}\n')
     print(f'The quicksort algorithm completed in {time_elapsed:.4f} milliseconds')
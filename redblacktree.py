@@ -213,11 +213,25 @@
 # Happy holidays
 #
 # Andrew
+#
+# ###### Set operations ######
+#
+# a.union(b) and a.intersection(b) move the nodes of b into a, so b is empty afterwards
+# If you still need b, copy it first, for example with RedBlackTree(b.to_list())
+#
+# a.difference(b) leaves b unchanged
+#
+# >>> a.union(b)
+# >>> a.union(RedBlackTree(b.to_list()))
 
+import bisect
+import collections
 import random
 import time
 import argparse
-import ast
+import dataio
+import snapshot
+import staticindex
 
 class Node:
     def __init__(self, value, color='red'):
@@ -227,6 +241,21 @@ class Node:
         self.right = None
         self.parent = None
         self.frequency = 1
+        # The records of a node are only stored in a list once the first record arrives, so a tree without records pays for nothing more than this attribute
+        self.records = None
+        self.node_count = 1
+        self.value_count = 1
+
+    # Every node keeps the number of nodes and the number of values in its subtree
+    def update(self):
+        self.node_count = 1
+        self.value_count = self.frequency
+        if self.left is not None:
+            self.node_count += self.left.node_count
+            self.value_count += self.left.value_count
+        if self.right is not None:
+            self.node_count += self.right.node_count
+            self.value_count += self.right.value_count
 
     def grandparent(self):
         if self.parent is None:
@@ -248,34 +277,243 @@ class Node:
     def __str__(self):
         return f'{self.value}{self.color}'
 
+# The number of levels that finger_search() climbs from the finger before it starts from the root instead
+FINGER_CLIMB = 4
+
+# union() and intersection() merge the two trees in one linear pass when the larger tree has at most this many times as many nodes as the smaller one, and search the larger tree for every node of the smaller one otherwise
+SET_MERGE_RATIO = 3
+
 class RedBlackTree:
-    def __init__(self, arr=None):
+    # If cache_size is given, search() keeps the nodes it found most recently in a cache of that many values
+    # If finger is also set, a search that misses the cache starts from the last node it found (the finger) instead of the root, which pays off when consecutive searches are for nearby values
+    # If tombstone_ratio is given, delete() only marks the node of a value as deleted (a tombstone), and the tree is rebuilt without its tombstones once they make up more than that fraction of the nodes
+    def __init__(self, arr=None, cache_size=0, finger=False, tombstone_ratio=None):
         self.root = None
+        self.tombstone_ratio = tombstone_ratio
+        self.tombstones = 0
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict() if cache_size else None
+        self.use_finger = finger
+        self.finger = None
+        self.cache_hits = 0
+        self.cache_misses = 0
         if arr:
-            for value in arr:
-                self.insert(value)
+            self.bulk_load(arr)
+
+    # We collapse each run of equal values into a single node and link the nodes bottom-up, which builds a balanced tree in linear time without calling insert()
+    def bulk_load(self, arr, presorted=False):
+        if not presorted:
+            arr = sorted(arr)
+        values = []
+        counts = []
+        for value in arr:
+            if values and value == values[-1]:
+                counts[-1] += 1
+            else:
+                values.append(value)
+                counts.append(1)
+        self._load(values, counts)
+
+    # We build the tree from (value, record) pairs, where the records of equal values are kept together in one node
+    def load_records(self, pairs, presorted=False):
+        if not presorted:
+            pairs = sorted(pairs, key=lambda pair: pair[0])
+        values = []
+        counts = []
+        records = []
+        for value, record in pairs:
+            if values and value == values[-1]:
+                counts[-1] += 1
+                records[-1].append(record)
+            else:
+                values.append(value)
+                counts.append(1)
+                records.append([record])
+        self._load(values, counts, records)
+
+    # Splitting at the midpoint fills every level except the deepest one
+    # If we color the deepest level red and every other level black, then every path from the root to a NIL node has the same number of black nodes, so no insert_fix() calls are needed
+    def _load(self, values, counts, records=None):
+        self.clear_cache()
+        self.tombstones = 0
+        red_depth = len(values).bit_length() - 1
+        self.root = self._build(values, counts, records, 0, len(values) - 1, 0, red_depth)
+        if self.root is not None:
+            self.root.color = 'black'
+
+    def _build(self, values, counts, records, start, end, depth, red_depth):
+        if start > end:
+            return None
+        mid = (start + end) // 2
+        node = Node(values[mid], 'red' if depth == red_depth else 'black')
+        node.frequency = counts[mid]
+        if records is not None:
+            node.records = records[mid]
+        node.left = self._build(values, counts, records, start, mid - 1, depth + 1, red_depth)
+        node.right = self._build(values, counts, records, mid + 1, end, depth + 1, red_depth)
+        if node.left is not None:
+            node.left.parent = node
+        if node.right is not None:
+            node.right.parent = node
+        node.update()
+        return node
 
     def search(self, value):
+        if self.cache is not None:
+            return self.cached_search(value)
         current = self.root
         while current is not None:
             if value == current.value:
-                return current
+                return current if current.frequency else None
             elif value < current.value:
                 current = current.left
             else:
                 current = current.right
         return None
 
-    def insert(self, value):
+    ###### Hot-key cache ######
+    #
+    # The cache maps values to their nodes, and it forgets the least recently used value once it holds more than cache_size values
+    #
+    # Rotations move nodes around but never move a value to another node, so they leave the cache valid
+    #
+    # delete() is different, because a node with two children takes the value of its successor, so delete() removes both values from the cache
+    #
+    # Anything that rebuilds the tree or moves nodes between trees (bulk loading, loading a snapshot, split, join and the set operations) clears the cache
+
+    def cached_search(self, value):
+        cache = self.cache
+        node = cache.get(value)
+        if node is not None:
+            cache.move_to_end(value)
+            self.cache_hits += 1
+            if self.use_finger:
+                self.finger = node
+            return node
+        self.cache_misses += 1
+        node = self.finger_search(value)
+        if node is not None:
+            cache[value] = node
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+            if self.use_finger:
+                self.finger = node
+        return node
+
+    # We climb from the finger until we reach a node whose subtree must contain the value, and search down from there
+    # A left child's subtree holds only values less than its parent, and a right child's subtree holds only values greater than its parent, so we stop climbing as soon as the parent bounds the value on the far side
+    # A value that is far from the finger would make us climb most of the way to the root and then walk back down, so we give up and start from the root after FINGER_CLIMB levels
+    def finger_search(self, value):
+        current = self.finger
+        climb = FINGER_CLIMB
+        if current is None:
+            current = self.root
+        elif value > current.value:
+            while current.parent is not None and not (current is current.parent.left and value < current.parent.value):
+                current = current.parent
+                climb -= 1
+                if climb == 0:
+                    current = self.root
+                    break
+        elif value < current.value:
+            while current.parent is not None and not (current is current.parent.right and value > current.parent.value):
+                current = current.parent
+                climb -= 1
+                if climb == 0:
+                    current = self.root
+                    break
+        while current is not None:
+            if value == current.value:
+                return current if current.frequency else None
+            elif value < current.value:
+                current = current.left
+            else:
+                current = current.right
+        return None
+
+    def forget(self, value):
+        if self.cache is not None:
+            self.cache.pop(value, None)
+        self.finger = None
+
+    def clear_cache(self):
+        if self.cache is not None:
+            self.cache.clear()
+        self.finger = None
+
+    # We return the number of cache hits and misses, and the fraction of searches that hit the cache
+    def cache_stats(self):
+        total = self.cache_hits + self.cache_misses
+        return {'hits': self.cache_hits, 'misses': self.cache_misses, 'hit_rate': self.cache_hits / total if total else 0.0}
+
+    # We answer a batch of searches in one walk down the tree
+    # The probes are sorted once, and each node splits its range of probes into those that go left and those that go right, so probes that share a path from the root share the work of walking it
+    def _search_many(self, values):
+        values = list(values)
+        order = sorted(range(len(values)), key=values.__getitem__)
+        probes = [values[i] for i in order]
+        results = [None] * len(values)
+        stack = [(self.root, 0, len(probes))] if self.root is not None and probes else []
+        while stack:
+            node, start, end = stack.pop()
+            # Once only a few probes share this subtree, it is cheaper to finish each of them with an ordinary search
+            if end - start <= 8:
+                for i in range(start, end):
+                    value = probes[i]
+                    current = node
+                    while current is not None and value != current.value:
+                        if value < current.value:
+                            current = current.left
+                        else:
+                            current = current.right
+                    results[order[i]] = current
+                continue
+            lo = bisect.bisect_left(probes, node.value, start, end)
+            hi = bisect.bisect_right(probes, node.value, lo, end)
+            for i in range(lo, hi):
+                results[order[i]] = node
+            if lo > start and node.left is not None:
+                stack.append((node.left, start, lo))
+            if hi < end and node.right is not None:
+                stack.append((node.right, hi, end))
+        if self.tombstones:
+            results = [node if node is not None and node.frequency else None for node in results]
+        return results
+
+    # We return the records stored with a value, in the order they were inserted
+    def records(self, value):
+        node = self.search(value)
+        if node is None or node.records is None:
+            return []
+        return node.records
+
+    # We return what search() would return for each value, in the order of the values
+    def search_many(self, values):
+        return self._search_many(values)
+
+    def contains_many(self, values):
+        return [node is not None for node in self._search_many(values)]
+
+    # A record can be stored along with the value, and it is chained to the records of equal values in the same node
+    def insert(self, value, record=None):
         node = Node(value)
+        if record is not None:
+            node.records = [record]
         if self.root is None:
             self.root = node
             self.insert_fix(node)
             return
         current = self.root
         while True:
+            current.value_count += 1
             if value == current.value:
+                if current.frequency == 0:
+                    self.tombstones -= 1
                 current.frequency += 1
+                if record is not None:
+                    if current.records is None:
+                        current.records = []
+                    current.records.append(record)
                 return
             elif value < current.value:
                 if current.left is None:
@@ -291,6 +529,7 @@ class RedBlackTree:
                     break
                 else:
                     current = current.right
+        self.adjust_counts(node.parent, 1, 0)
         self.insert_fix(node)
 
     def insert_fix(self, node):
@@ -323,19 +562,116 @@ class RedBlackTree:
                     node.parent.color = 'black'
                     node.grandparent().color = 'red'
                     self.rotate_left(node.grandparent())
+        # The black height of the tree grows by one when the red root is recolored black
+        grew = self.root.color == 'red'
         self.root.color = 'black'
+        return grew
 
     def delete(self, value):
         node = self.search(value)
         if node is None:
             return
-        if node.left is None or node.right is None:
-            self.replace_node(node, node.left or node.right)
-        else:
+        self.forget(value)
+        if self.tombstone_ratio is not None:
+            self.mark_deleted(node)
+            return
+        # A node with two children takes the value of its successor, and then we remove the successor, which has at most one child
+        if node.left is not None and node.right is not None:
             successor = self.find_min(node.right)
+            self.forget(successor.value)
+            self.adjust_counts(node, 0, successor.frequency - node.frequency)
             node.value = successor.value
-            self.replace_node(successor, successor.right)
-        self.delete_fix(node)
+            node.frequency = successor.frequency
+            node.records = successor.records
+            node = successor
+        child = node.left or node.right
+        if child is not None:
+            # A node with exactly one child is black, and its child is a red leaf
+            self.replace_node(node, child)
+            child.color = 'black'
+        else:
+            # We fix a black leaf while it is still in the tree, so that it stands in for the NIL node that will replace it
+            if node.color == 'black':
+                self.delete_fix(node)
+            self.replace_node(node, None)
+        self.adjust_counts(node.parent, -1, -node.frequency)
+
+    ###### Tombstones ######
+    #
+    # A tombstone is a node with a frequency of 0, which stays in the tree until the next compaction
+    #
+    # Marking a node only has to subtract its frequency from the value counts of its ancestors, so it takes O(log n) time and never rotates
+    #
+    # search() and the iterators skip tombstones, and size() does not count them
+    #
+    # Anything that moves nodes between trees (split, join and the set operations) or writes the tree out (save and freeze) compacts the tree first
+
+    def mark_deleted(self, node):
+        self.adjust_counts(node, 0, -node.frequency)
+        node.frequency = 0
+        node.records = None
+        self.tombstones += 1
+        if self.tombstones > self.tombstone_ratio * self.root.node_count:
+            self.compact()
+
+    # We relink the live nodes into a balanced tree in one linear pass, colored like bulk_load() colors it, so no nodes are allocated
+    def compact(self):
+        nodes = []
+        stack = []
+        current = self.root
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            if current.frequency:
+                nodes.append(current)
+            current = current.right
+        self.clear_cache()
+        self.tombstones = 0
+        self.root = self._relink(nodes, 0, len(nodes) - 1, 0, len(nodes).bit_length() - 1)
+        if self.root is not None:
+            self.root.parent = None
+            self.root.color = 'black'
+
+    def _relink(self, nodes, start, end, depth, red_depth):
+        if start > end:
+            return None
+        mid = (start + end) // 2
+        node = nodes[mid]
+        node.color = 'red' if depth == red_depth else 'black'
+        node.left = self._relink(nodes, start, mid - 1, depth + 1, red_depth)
+        node.right = self._relink(nodes, mid + 1, end, depth + 1, red_depth)
+        if node.left is not None:
+            node.left.parent = node
+        if node.right is not None:
+            node.right.parent = node
+        node.update()
+        return node
+
+    # We remove one record from the node of its value, and the node itself once its last occurrence is gone
+    def delete_record(self, value, record):
+        node = self.search(value)
+        if node is None or node.records is None:
+            return False
+        for i, current in enumerate(node.records):
+            if current is record:
+                del node.records[i]
+                break
+        else:
+            return False
+        if node.frequency == 1:
+            self.delete(value)
+        else:
+            node.frequency -= 1
+            self.adjust_counts(node, 0, -1)
+        return True
+
+    def adjust_counts(self, node, node_change, value_change):
+        while node is not None:
+            node.node_count += node_change
+            node.value_count += value_change
+            node = node.parent
 
     def delete_fix(self, x):
         while x != self.root and x.color == 'black':
@@ -404,6 +740,10 @@ class RedBlackTree:
         right_child.left = node
         node.parent = right_child
 
+        right_child.node_count = node.node_count
+        right_child.value_count = node.value_count
+        node.update()
+
     def rotate_right(self, node):
         left_child = node.left
         node.left = left_child.right
@@ -423,6 +763,10 @@ class RedBlackTree:
         left_child.right = node
         node.parent = left_child
 
+        left_child.node_count = node.node_count
+        left_child.value_count = node.value_count
+        node.update()
+
     def replace_node(self, old_node, new_node):
         if old_node.parent is None:
             self.root = new_node
@@ -439,23 +783,428 @@ class RedBlackTree:
             node = node.left
         return node
 
-    def to_list(self):
-        sorted_list = []
+    # ###### Split and join ######
+    #
+    # join() links two trees and a pivot value, where every value in the left tree is less than the pivot and every value in the right tree is greater than the pivot
+    #
+    # We walk down the side of the taller tree until we reach a black node with the same black height as the shorter tree, hang the pivot there as a red node, and let insert_fix() repair the path above it
+    #
+    # This takes time proportional to the difference in black heights
+    #
+    # split() cuts a tree into the values less than a key and the values greater than or equal to it, by splitting the subtree on the search path and joining the pieces back together on the way up
+    #
+    # difference() is built on split() and join(), and it takes O(m log(n/m + 1)) time for trees of m and n nodes, where m <= n
+    #
+    # union() and intersection() could be built the same way, but every level of split() and join() runs several Python calls, which makes them slower than inserting the smaller tree into the larger one
+    # So they search or merge instead (see the comment above union())
+    #
+    # The helper methods below pass black heights along with the nodes, so we never have to measure a subtree
+    #
+    # The black height of a subtree is the number of black nodes on any path from its root down to a NIL node, including the root
+
+    def black_height(self, node):
+        height = 0
+        while node is not None:
+            if node.color == 'black':
+                height += 1
+            node = node.left
+        return height
+
+    # A detached subtree becomes the root of its own tree, so it has to be black
+    def _detach(self, node, height):
+        if node is None:
+            return None, 0
+        node.parent = None
+        if node.color == 'red':
+            node.color = 'black'
+            height += 1
+        return node, height
+
+    def _join(self, left, left_height, pivot, right, right_height):
+        pivot.parent = None
+        if left_height == right_height:
+            pivot.left = left
+            pivot.right = right
+            if left is not None:
+                left.parent = pivot
+            if right is not None:
+                right.parent = pivot
+            pivot.color = 'black'
+            pivot.update()
+            return pivot, left_height + 1
+        taller_height = max(left_height, right_height)
+        if left_height > right_height:
+            root, height = left, left_height
+            parent = None
+            current = left
+            while current is not None and (current.color == 'red' or height > right_height):
+                if current.color == 'black':
+                    height -= 1
+                parent = current
+                current = current.right
+            parent.right = pivot
+            pivot.left = current
+            pivot.right = right
+        else:
+            root, height = right, right_height
+            parent = None
+            current = right
+            while current is not None and (current.color == 'red' or height > left_height):
+                if current.color == 'black':
+                    height -= 1
+                parent = current
+                current = current.left
+            parent.left = pivot
+            pivot.left = left
+            pivot.right = current
+        pivot.parent = parent
+        if pivot.left is not None:
+            pivot.left.parent = pivot
+        if pivot.right is not None:
+            pivot.right.parent = pivot
+        pivot.color = 'red'
+        pivot.update()
+        # The pivot took the place of current, so every node on the walked path grows by the difference between their counts
+        node_change, value_change = pivot.node_count, pivot.value_count
+        if current is not None:
+            node_change -= current.node_count
+            value_change -= current.value_count
+        self.adjust_counts(parent, node_change, value_change)
+        self.root = root
+        if self.insert_fix(pivot):
+            taller_height += 1
+        return self.root, taller_height
+
+    # We join two trees without a pivot by removing the largest node of the left tree and using it as the pivot
+    def _join_trees(self, left, left_height, right, right_height):
+        if left is None:
+            return right, right_height
+        if right is None:
+            return left, left_height
+        left, left_height, last = self._split_last(left, left_height)
+        return self._join(left, left_height, last, right, right_height)
+
+    def _split_last(self, node, height):
+        child_height = height - (1 if node.color == 'black' else 0)
+        left, left_height = self._detach(node.left, child_height)
+        if node.right is None:
+            return left, left_height, node
+        right, right_height = self._detach(node.right, child_height)
+        rest, rest_height, last = self._split_last(right, right_height)
+        rest, rest_height = self._join(left, left_height, node, rest, rest_height)
+        return rest, rest_height, last
+
+    # We return the values less than the key, the node holding the key (or None), and the values greater than the key
+    def _split(self, node, height, value):
+        if node is None:
+            return None, 0, None, None, 0
+        child_height = height - (1 if node.color == 'black' else 0)
+        left, left_height = self._detach(node.left, child_height)
+        right, right_height = self._detach(node.right, child_height)
+        if value == node.value:
+            return left, left_height, node, right, right_height
+        elif value < node.value:
+            less, less_height, middle, greater, greater_height = self._split(left, left_height, value)
+            greater, greater_height = self._join(greater, greater_height, node, right, right_height)
+        else:
+            less, less_height, middle, greater, greater_height = self._split(right, right_height, value)
+            less, less_height = self._join(left, left_height, node, less, less_height)
+        return less, less_height, middle, greater, greater_height
+
+    # Only the first tree is taken apart, so the second tree can be walked without being modified
+    def _difference(self, a, a_height, b):
+        if a is None:
+            return None, 0
+        if b is None:
+            return a, a_height
+        a_left, a_left_height, middle, a_right, a_right_height = self._split(a, a_height, b.value)
+        left, left_height = self._difference(a_left, a_left_height, b.left)
+        right, right_height = self._difference(a_right, a_right_height, b.right)
+        return self._join_trees(left, left_height, right, right_height)
+
+    # We return the nodes of a subtree in increasing order
+    def _nodes(self, root):
+        nodes = []
         stack = []
-        current = self.root
+        current = root
         while current or stack:
             while current:
                 stack.append(current)
                 current = current.left
             current = stack.pop()
-            for _ in range(current.frequency):
-                sorted_list.append(current.value)
+            nodes.append(current)
             current = current.right
-        return sorted_list
+        return nodes
 
-    def size(self):
-        node_count = 0
-        value_count = 0
+    # We insert a node taken from another tree, and it keeps its frequency and records, or adds them to the node of an equal value
+    def _insert_node(self, node):
+        node.left = None
+        node.right = None
+        node.parent = None
+        node.color = 'red'
+        node.node_count = 1
+        node.value_count = node.frequency
+        if self.root is None:
+            self.root = node
+            self.insert_fix(node)
+            return
+        # We count the new node on the way down, so we don't have to walk back up, and we take it back off if the value is already there
+        value, frequency = node.value, node.frequency
+        current = self.root
+        while True:
+            current.node_count += 1
+            current.value_count += frequency
+            if value == current.value:
+                current.frequency += frequency
+                if node.records is not None:
+                    current.records = (current.records or []) + node.records
+                self.adjust_counts(current, -1, 0)
+                return
+            parent = current
+            current = current.left if value < current.value else current.right
+            if current is None:
+                break
+        if value < parent.value:
+            parent.left = node
+        else:
+            parent.right = node
+        node.parent = parent
+        self.insert_fix(node)
+
+    # We add the frequency and records of b to a
+    def _merge_node(self, a, b):
+        a.frequency += b.frequency
+        if b.records is not None:
+            a.records = (a.records or []) + b.records
+
+    # We merge the nodes of two sorted lists, keeping only the values in both if intersect is set, and relink them into a balanced tree
+    def _merge_trees(self, a, b, intersect):
+        a_nodes, b_nodes = self._nodes(a), self._nodes(b)
+        nodes = []
+        i = j = 0
+        while i < len(a_nodes) and j < len(b_nodes):
+            if a_nodes[i].value < b_nodes[j].value:
+                if not intersect:
+                    nodes.append(a_nodes[i])
+                i += 1
+            elif b_nodes[j].value < a_nodes[i].value:
+                if not intersect:
+                    nodes.append(b_nodes[j])
+                j += 1
+            else:
+                self._merge_node(a_nodes[i], b_nodes[j])
+                nodes.append(a_nodes[i])
+                i += 1
+                j += 1
+        if not intersect:
+            nodes.extend(a_nodes[i:])
+            nodes.extend(b_nodes[j:])
+        return self._balanced(nodes)
+
+    def _balanced(self, nodes):
+        root = self._relink(nodes, 0, len(nodes) - 1, 0, len(nodes).bit_length() - 1)
+        if root is not None:
+            root.parent = None
+            root.color = 'black'
+        return root
+
+    # We search the larger tree for every node of the smaller tree, and relink the nodes found into a balanced tree
+    def _intersect_by_search(self, small, large):
+        nodes = []
+        for node in self._nodes(small):
+            current = large
+            while current is not None and current.value != node.value:
+                current = current.left if node.value < current.value else current.right
+            if current is not None:
+                self._merge_node(node, current)
+                nodes.append(node)
+        return self._balanced(nodes)
+
+    # We return 'search' or 'merge', the strategy for union() and intersection() on trees of m and n nodes, where m <= n
+    def set_strategy(self, m, n):
+        if n <= SET_MERGE_RATIO * m:
+            return 'merge'
+        return 'search'
+
+    def _tree(self, root):
+        tree = RedBlackTree(cache_size=self.cache_size, finger=self.use_finger, tombstone_ratio=self.tombstone_ratio)
+        tree.root = root
+        return tree
+
+    # We split the tree into a tree of the values less than the key and a tree of the values greater than or equal to the key
+    # The nodes are moved into the two new trees, so this tree is left empty
+    def split(self, value):
+        self.clear_cache()
+        if self.tombstones:
+            self.compact()
+        less, less_height, middle, greater, greater_height = self._split(self.root, self.black_height(self.root), value)
+        if middle is not None:
+            greater, greater_height = self._join(None, 0, middle, greater, greater_height)
+        self.root = None
+        return self._tree(less), self._tree(greater)
+
+    # We return a new tree holding the values of both trees and the pivot, and leave both trees empty
+    @staticmethod
+    def join(left, pivot, right):
+        for tree in (left, right):
+            if tree.tombstones:
+                tree.compact()
+        if (left.root and left.find_max(left.root).value >= pivot) or (right.root and right.find_min(right.root).value <= pivot):
+            raise ValueError('The left tree must be less than the pivot and the right tree must be greater than the pivot')
+        tree = RedBlackTree()
+        root, height = tree._join(left.root, tree.black_height(left.root), Node(pivot), right.root, tree.black_height(right.root))
+        tree.root = root
+        left.root = None
+        right.root = None
+        left.clear_cache()
+        right.clear_cache()
+        return tree
+
+    def compact_both(self, other):
+        if self.tombstones:
+            self.compact()
+        if other.tombstones:
+            other.compact()
+
+    # The set operations below move the nodes of the other tree into this one, adding up the frequencies of values that appear in both
+    #
+    # union() and intersection() consume the other tree: its nodes become part of this tree, and the other tree is left empty
+    # Copy the other tree first (for example with RedBlackTree(other.to_list())) if you still need it
+    # difference() leaves the other tree unchanged
+    #
+    # For trees of m and n nodes, where m <= n, union() and intersection() pick one of two strategies (see set_strategy())
+    #
+    # 1. search: if n is more than SET_MERGE_RATIO times m, we insert (or look up) the m nodes of the smaller tree in the larger tree one at a time, which takes O(m log n) time
+    #    A node moves over with its frequency and records, so a value that appears k times costs one insert instead of k
+    # 2. merge: otherwise, we merge the two sorted lists of nodes and relink them into a balanced tree, which takes O(m + n) time
+    #
+    # python benchmark.py -b union compares union() with inserting the values of the smaller tree one at a time
+    def union(self, other):
+        self.clear_cache()
+        other.clear_cache()
+        self.compact_both(other)
+        a, b = self.root, other.root
+        other.root = None
+        if a is None or b is None:
+            self.root = a or b
+            return
+        if a.node_count > b.node_count:
+            a, b = b, a
+        if self.set_strategy(a.node_count, b.node_count) == 'search':
+            self.root = b
+            for node in self._nodes(a):
+                self._insert_node(node)
+        else:
+            self.root = self._merge_trees(a, b, False)
+
+    def intersection(self, other):
+        self.clear_cache()
+        other.clear_cache()
+        self.compact_both(other)
+        a, b = self.root, other.root
+        other.root = None
+        if a is None or b is None:
+            self.root = None
+            return
+        if a.node_count > b.node_count:
+            a, b = b, a
+        if self.set_strategy(a.node_count, b.node_count) == 'search':
+            self.root = self._intersect_by_search(a, b)
+        else:
+            self.root = self._merge_trees(a, b, True)
+
+    def difference(self, other):
+        self.clear_cache()
+        self.compact_both(other)
+        self.root, height = self._difference(self.root, self.black_height(self.root), other.root)
+
+    def find_max(self, node):
+        while node.right is not None:
+            node = node.right
+        return node
+
+    # We follow the parent pointers to step to the next node in the inorder traversal
+    def next_node(self, node):
+        if node.right is not None:
+            return self.find_min(node.right)
+        while node.parent is not None and node == node.parent.right:
+            node = node.parent
+        return node.parent
+
+    def prev_node(self, node):
+        if node.left is not None:
+            return self.find_max(node.left)
+        while node.parent is not None and node == node.parent.left:
+            node = node.parent
+        return node.parent
+
+    # We return the node with the smallest value that is greater than or equal to the given value (or strictly greater, if strict is set)
+    def ceiling_node(self, value, strict=False):
+        result = None
+        current = self.root
+        while current is not None:
+            if value < current.value or (value == current.value and not strict):
+                result = current
+                current = current.left
+            else:
+                current = current.right
+        while result is not None and result.frequency == 0:
+            result = self.next_node(result)
+        return result
+
+    # We return the node with the largest value that is less than or equal to the given value (or strictly less, if strict is set)
+    def floor_node(self, value, strict=False):
+        result = None
+        current = self.root
+        while current is not None:
+            if value > current.value or (value == current.value and not strict):
+                result = current
+                current = current.right
+            else:
+                current = current.left
+        while result is not None and result.frequency == 0:
+            result = self.prev_node(result)
+        return result
+
+    def successor(self, value):
+        node = self.ceiling_node(value, strict=True)
+        return node.value if node else None
+
+    def predecessor(self, value):
+        node = self.floor_node(value, strict=True)
+        return node.value if node else None
+
+    # The iterators below find their starting node in O(log n) time and then follow the parent pointers, so they use O(1) extra memory
+    def range_nodes(self, lo, hi):
+        node = self.ceiling_node(lo)
+        while node is not None and node.value <= hi:
+            if node.frequency:
+                yield node
+            node = self.next_node(node)
+
+    # We yield the values v such that lo <= v <= hi in increasing order, repeating each value as many times as it occurs, like to_list()
+    def range(self, lo, hi):
+        for node in self.range_nodes(lo, hi):
+            for _ in range(node.frequency):
+                yield node.value
+
+    # We yield (value, frequency) pairs in increasing order, starting with the first value greater than or equal to the given value
+    def items_from(self, value):
+        node = self.ceiling_node(value)
+        while node is not None:
+            if node.frequency:
+                yield (node.value, node.frequency)
+            node = self.next_node(node)
+
+    def reverse_iter(self):
+        node = self.find_max(self.root) if self.root else None
+        while node is not None:
+            for _ in range(node.frequency):
+                yield node.value
+            node = self.prev_node(node)
+
+    def to_list(self):
+        sorted_list = []
         stack = []
         current = self.root
         while current or stack:
@@ -463,46 +1212,190 @@ class RedBlackTree:
                 stack.append(current)
                 current = current.left
             current = stack.pop()
-            node_count += 1
-            value_count += current.frequency
+            for _ in range(current.frequency):
+                sorted_list.append(current.value)
             current = current.right
-        return (node_count, value_count)
+        return sorted_list
 
-    def height(self):
+    def size(self):
         if self.root is None:
-            return 0
-        queue = []
-        queue.append(self.root)
+            return (0, 0)
+        return (self.root.node_count - self.tombstones, self.root.value_count)
+
+    def height(self):
         height = 0
-        while queue:
-            level_size = len(queue)
-            for _ in range(level_size):
-                current = queue.pop(0)
+        level = [self.root] if self.root else []
+        while level:
+            next_level = []
+            for current in level:
                 if current.left:
-                    queue.append(current.left)
+                    next_level.append(current.left)
                 if current.right:
-                    queue.append(current.right)
+                    next_level.append(current.right)
+            level = next_level
             height += 1
         return height
 
-    def _str(self, node):
-        if node is None:
-            return ''
-        elif node.left is None and node.right is None:
-            return f'{node.value}'
-        elif node.left and node.right is None:
-            leftchild = self._str(node.left)
-            return f'{node.value}({leftchild})'
-        elif node.left is None and node.right:
-            rightchild = self._str(node.right)
-            return f'{node.value}({rightchild})'
-        else:
-            leftchild = self._str(node.left)
-            rightchild = self._str(node.right)
-            return f'{node.value}({leftchild})({rightchild})'
+    # The rank of a value is the number of values in the tree that are less than it (or less than or equal to it, if inclusive is set)
+    def rank(self, value, inclusive=False):
+        rank = 0
+        current = self.root
+        while current is not None:
+            left_count = current.left.value_count if current.left else 0
+            if value == current.value:
+                rank += left_count
+                if inclusive:
+                    rank += current.frequency
+                break
+            elif value < current.value:
+                current = current.left
+            else:
+                rank += left_count + current.frequency
+                current = current.right
+        return rank
+
+    # We return the kth smallest value, counting from zero, where a value with a frequency of f takes up f positions
+    def select(self, k):
+        if self.root is None or k < 0 or k >= self.root.value_count:
+            raise IndexError('select index out of range')
+        current = self.root
+        while True:
+            left_count = current.left.value_count if current.left else 0
+            if k < left_count:
+                current = current.left
+            elif k < left_count + current.frequency:
+                return current.value
+            else:
+                k -= left_count + current.frequency
+                current = current.right
+
+    # We count the values v such that lo <= v <= hi
+    def count_range(self, lo, hi):
+        if hi < lo:
+            return 0
+        return self.rank(hi, inclusive=True) - self.rank(lo)
+
+    # We perform a preorder traversal to get a string representation of the red-black tree
+    # The stack holds the nodes we have yet to visit, along with the parentheses that surround them
+    # The tree is only read, never changed, so a string can be taken in the middle of a range() or items_from() iteration
+    def _str(self, write):
+        root = self._str_item(self.root)
+        stack = [root] if root else []
+        while stack:
+            item = stack.pop()
+            if item.__class__ is str:
+                write(item)
+                continue
+            if item.__class__ is tuple:
+                nodes, start, end = item
+                mid = (start + end) // 2
+                write(f'{nodes[mid].value}')
+                if mid < end:
+                    stack += (')', (nodes, mid + 1, end), '(')
+                if start < mid:
+                    stack += (')', (nodes, start, mid - 1), '(')
+                continue
+            write(f'{item.value}')
+            right, left = self._str_item(item.right), self._str_item(item.left)
+            if right:
+                stack += (')', right, '(')
+            if left:
+                stack += (')', left, '(')
+
+    # A tombstone can't simply be left out, because its children would lose their parent
+    # So we show the live values below a tombstone as the balanced subtree that compact() would build from them, as a (nodes, start, end) tuple, and None if there are none
+    def _str_item(self, node):
+        if node is None or node.frequency:
+            return node
+        nodes = []
+        stack = []
+        current = node
+        while current or stack:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            if current.frequency:
+                nodes.append(current)
+            current = current.right
+        return (nodes, 0, len(nodes) - 1) if nodes else None
 
     def str(self):
-        return self._str(self.root)
+        parts = []
+        self._str(parts.append)
+        return ''.join(parts)
+
+    # We stream the string representation to a file piece by piece, so the whole string is never held in memory
+    def write(self, file):
+        self._str(file.write)
+
+    # We yield (value, frequency, depth, red) tuples in increasing order for snapshot.save()
+    def _entries(self):
+        stack = []
+        current = self.root
+        depth = 0
+        while current or stack:
+            while current:
+                stack.append((current, depth))
+                current = current.left
+                depth += 1
+            current, depth = stack.pop()
+            yield (current.value, current.frequency, depth, 1 if current.color == 'red' else 0)
+            current = current.right
+            depth += 1
+
+    # We copy the keys and frequencies into a read-only StaticIndex, which is faster to search and much smaller than the nodes
+    def freeze(self, layout='sorted', use_numpy=False):
+        if self.tombstones:
+            self.compact()
+        keys = []
+        frequencies = []
+        for value, frequency, _, _ in self._entries():
+            keys.append(value)
+            frequencies.append(frequency)
+        return staticindex.StaticIndex(keys, frequencies, layout, use_numpy)
+
+    def save(self, path):
+        if self.tombstones:
+            self.compact()
+        node_count, value_count = self.size()
+        typecode = snapshot.keys_typecode(value for value, _, _, _ in self._entries())
+        snapshot.save(path, self._entries(), node_count, typecode, shapes=True)
+
+    def load(self, path):
+        snapshot.load(path, self._load_snapshot)
+
+    # The inorder keys and the depths describe exactly one tree, which we rebuild in a single pass with a stack that holds the right spine of the tree built so far
+    # Each node adopts the deeper nodes it pops off the stack as its left subtree, and hangs off the node left on top of the stack as its right child
+    def _load_snapshot(self, keys, frequencies, shapes):
+        self.clear_cache()
+        self.tombstones = 0
+        if shapes is None:
+            self._load(keys, frequencies)
+            return
+        stack = []
+        depths = []
+        for i in range(len(keys)):
+            shape = shapes[i]
+            depth = shape >> 1
+            node = Node(keys[i], 'red' if shape & 1 else 'black')
+            node.frequency = frequencies[i]
+            last = None
+            while depths and depths[-1] > depth:
+                last = stack.pop()
+                depths.pop()
+                last.update()
+            if last is not None:
+                node.left = last
+                last.parent = node
+            if stack:
+                stack[-1].right = node
+                node.parent = stack[-1]
+            stack.append(node)
+            depths.append(depth)
+        self.root = stack[0] if stack else None
+        while stack:
+            stack.pop().update()
 
     def __str__(self):
         return self.str()
@@ -513,38 +1406,46 @@ if __name__ == '__main__':
     group.add_argument('-i', '--inputfile', type=str)
     group.add_argument('-n', '--numbers', nargs='+', type=int) 
     group.add_argument('-r', '--random', action='store_true')
+    group.add_argument('-l', '--loadfile', type=str)
     parser.add_argument('-s', '--size', type=float, default=10)
     parser.add_argument('-min', '--minimum', type=float, default=0)
     parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
     parser.add_argument('-t', '--test', nargs='+', type=int)
     parser.add_argument('-o', '--outputfile', type=str)
+    parser.add_argument('-d', '--dumpfile', type=str)
     args = parser.parse_args()
     if args.inputfile:
-        with open(args.inputfile, 'r') as file:
-            contents = file.read()
-            arr = ast.literal_eval(contents)
+        arr = dataio.read(args.inputfile, args.format)
     elif args.numbers:
         arr = args.numbers
     elif args.random:
         size, min, max = int(args.size), int(args.minimum), int(args.maximum)
         arr = [random.randint(min, max) for i in range(size)]
-    if len(arr) <= 1000:
-        print(f'Unsorted list')
-        print('------------------------------')
-        print(f'{arr}\n')
-    tree = RedBlackTree(arr)
-    root_value = tree.root.value
+    if args.loadfile:
+        tree = RedBlackTree()
+        start_time = time.time()
+        tree.load(args.loadfile)
+        time_elapsed = 1000 * (time.time() - start_time)
+        print(f'Loaded {args.loadfile} in {time_elapsed:.4f} milliseconds\n')
+        arr = tree.to_list() if args.test else []
+    else:
+        if len(arr) <= 1000:
+            print(f'Unsorted list')
+            print('------------------------------')
+            print(f'{list(arr)}\n')
+        tree = RedBlackTree(arr)
+    root_value = tree.root.value if tree.root else None
     node_count, value_count = tree.size()
     height = tree.height()
     print('Statistics')
     print('------------------------------')
     print(f'Root value: {root_value} Node count: {node_count} Value count: {value_count} Height: {height}')
-    prefix_expression = tree.str()
     if node_count <= 1000:
         print('')
         print('String representation')
         print('------------------------------')
-        print(prefix_expression)
+        print(tree.str())
     if args.test:
         print('')
         print('Linear search results')
@@ -576,4 +1477,6 @@ if __name__ == '__main__':
                 print('')
     if args.outputfile:
         with open(args.outputfile, 'w') as file:
-            file.write(prefix_expression)
+            tree.write(file)
+    if args.dumpfile:
+        tree.save(args.dumpfile)
@@ -0,0 +1,180 @@
+# ###### Introduction ######
+#
+# This file replays a log of operations against a binary search tree or a red-black tree and reports how long the operations took
+#
+# An operation log has one operation per line, and there are four kinds of operations
+#
+# insert 42
+# delete 42
+# search 42
+# range 10 20
+#
+# Blank lines and lines that start with # are skipped, and the values can be integers, floats, or any Python literal
+#
+# The log is read one line at a time, so it can be much larger than memory
+#
+# Every operation is timed on its own with time.perf_counter_ns(), and the time goes into a histogram for its kind of operation
+#
+# A histogram with one bucket per nanosecond would be huge, so the buckets grow with the latency
+#
+# Every power of two is split into 8 buckets, so a latency is rounded up by at most 1/8 (12.5%), and a few hundred buckets cover everything from 1 nanosecond to hours
+#
+# From the histograms we report the throughput and the 50th, 99th and 99.9th percentile latencies (p50, p99 and p999) of each kind of operation
+#
+# ###### Examples ######
+#
+# Example 1: Generate a log of one million random operations, and replay it against a red-black tree
+#
+# % python replay.py -g 1e6 -max 1e6 ops.log
+# % python replay.py -t rbt ops.log
+#
+# Example 2: Load a tree from a snapshot before replaying a log against it
+#
+# % python replay.py -t bst -l tree.snap ops.log
+
+import ast
+import random
+import sys
+import time
+import argparse
+import bst
+import redblacktree
+
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+class Histogram:
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    # Latencies below 2 * SUB_BUCKETS get a bucket each, and every power of two above that is split into SUB_BUCKETS buckets
+    def bucket(self, latency):
+        if latency < 2 * SUB_BUCKETS:
+            return latency
+        shift = latency.bit_length() - SUB_BUCKET_BITS - 1
+        return shift * SUB_BUCKETS + (latency >> shift)
+
+    # We return the largest latency that falls into a bucket
+    def upper_bound(self, bucket):
+        if bucket < 2 * SUB_BUCKETS:
+            return bucket
+        shift = bucket // SUB_BUCKETS - 1
+        return ((bucket % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, latency):
+        bucket = self.bucket(latency)
+        if bucket >= len(self.counts):
+            self.counts.extend([0] * (bucket + 1 - len(self.counts)))
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+
+    # We return the latency below which the given fraction of the operations fall (rounded up to the end of its bucket)
+    def percentile(self, fraction):
+        if self.count == 0:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+def parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return ast.literal_eval(text)
+
+def consume(iterator):
+    count = 0
+    for _ in iterator:
+        count += 1
+    return count
+
+# We return one histogram for each kind of operation, and the total time of the replay in nanoseconds
+def replay(tree, lines):
+    operations = {
+        'insert': tree.insert,
+        'delete': tree.delete,
+        'search': tree.search,
+        'range': lambda lo, hi: consume(tree.range(lo, hi)),
+    }
+    histograms = {name: Histogram() for name in operations}
+    clock = time.perf_counter_ns
+    start_time = clock()
+    for number, line in enumerate(lines, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        name = fields[0]
+        if name not in operations:
+            raise ValueError(f'Line {number}: unknown operation {name}')
+        arguments = [parse_value(field) for field in fields[1:]]
+        operation = operations[name]
+        before = clock()
+        operation(*arguments)
+        histograms[name].record(clock() - before)
+    return histograms, clock() - start_time
+
+def generate(file, count, maximum, ratios):
+    names = list(ratios)
+    weights = [ratios[name] for name in names]
+    for name in random.choices(names, weights, k=count):
+        value = random.randint(0, maximum)
+        if name == 'range':
+            file.write(f'range {value} {value + maximum // 1000}\n')
+        else:
+            file.write(f'{name} {value}\n')
+
+def report(histograms, elapsed):
+    total = sum(histogram.count for histogram in histograms.values())
+    print('Replay results')
+    print('------------------------------')
+    print(f'{total} operations in {elapsed / 1e9:.3f} seconds ({total / (elapsed / 1e9 or 1):.0f} operations per second)')
+    print('')
+    print(f'{"operation":<10} {"count":>10} {"ops/s":>12} {"mean":>10} {"p50":>10} {"p99":>10} {"p999":>10} {"max":>10}')
+    for name, histogram in histograms.items():
+        if histogram.count == 0:
+            continue
+        throughput = histogram.count / (histogram.total / 1e9 or 1)
+        mean = histogram.total / histogram.count
+        p50, p99, p999 = histogram.percentile(0.5), histogram.percentile(0.99), histogram.percentile(0.999)
+        print(f'{name:<10} {histogram.count:>10} {throughput:>12.0f} {mean:>8.0f}ns {p50:>8}ns {p99:>8}ns {p999:>8}ns {histogram.max:>8}ns')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='replay.py', description='Replay an operation log against a search tree')
+    parser.add_argument('logfile', type=str)
+    parser.add_argument('-t', '--tree', choices=['bst', 'rbt'], default='rbt')
+    parser.add_argument('-a', '--alpha', type=float)
+    parser.add_argument('-l', '--loadfile', type=str)
+    parser.add_argument('-g', '--generate', type=float)
+    parser.add_argument('-max', '--maximum', type=float, default=1e6)
+    parser.add_argument('--mix', nargs=4, type=float, default=[25, 10, 60, 5], metavar=('INSERT', 'DELETE', 'SEARCH', 'RANGE'))
+    args = parser.parse_args()
+    if args.generate:
+        ratios = dict(zip(['insert', 'delete', 'search', 'range'], args.mix))
+        with open(args.logfile, 'w') as file:
+            generate(file, int(args.generate), int(args.maximum), ratios)
+        sys.exit(0)
+    if args.tree == 'bst':
+        tree = bst.BinarySearchTree(alpha=args.alpha)
+    else:
+        tree = redblacktree.RedBlackTree()
+    if args.loadfile:
+        tree.load(args.loadfile)
+    if args.logfile == '-':
+        histograms, elapsed = replay(tree, sys.stdin)
+    else:
+        with open(args.logfile, 'r') as file:
+            histograms, elapsed = replay(tree, file)
+    report(histograms, elapsed)
@@ -0,0 +1,133 @@
+# ###### Introduction ######
+#
+# This file saves a tree to a compact binary file (a snapshot) and loads it back
+#
+# A snapshot has a 16 byte header followed by three sections
+#
+# 1. The keys in increasing order, as little-endian 64-bit integers or 64-bit floats
+# 2. The frequency of each key, as little-endian 64-bit integers
+# 3. For red-black trees only, one byte per key that holds the depth of the node and its color (depth << 1 | red)
+#
+# The inorder keys and the depths describe exactly one tree, so a red-black tree comes back with the same shape and colors it was saved with
+#
+# Saving writes the sections in chunks while it walks the tree, so we never hold a copy of the whole tree in memory
+#
+# Loading maps the file into memory and hands the sections to the tree as memoryviews, so the file is read without being parsed or copied
+#
+# We write the snapshot to a temporary file next to the target (the path with .tmp added) and rename it over the target at the end, so a save that fails leaves the previous snapshot in place
+#
+# The header is made up of the magic bytes b'TREE', a version number, the key typecode ('q' or 'd'), a flag that tells us if the shape section is present, and the number of keys
+
+import array
+import gc
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'TREE'
+VERSION = 1
+HEADER = struct.Struct('<4sBcBxQ')
+CHUNK_SIZE = 65536
+
+# We check every key, because array.array('d', ...) would silently turn the integers among float keys into floats
+# The keys are in increasing order, like the entries of save(), so only the first and the last key can fall outside 64 bits
+def keys_typecode(keys):
+    typecodes = set()
+    first = last = None
+    for last in keys:
+        if first is None:
+            first = last
+        typecodes.add(type(last))
+    if not typecodes:
+        return 'q'
+    if typecodes == {float}:
+        return 'd'
+    if typecodes != {int}:
+        raise ValueError('Snapshots can only store keys that are all integers or all floats')
+    if first < -2 ** 63 or last >= 2 ** 63:
+        raise ValueError('Snapshots can only store integer keys that fit in 64 bits')
+    return 'q'
+
+# The entries are (value, frequency, depth, red) tuples in increasing order of value
+def save(path, entries, count, typecode, shapes=False):
+    temporary_path = path + '.tmp'
+    try:
+        with open(temporary_path, 'wb') as file:
+            _save(file, entries, count, typecode, shapes)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+def _save(file, entries, count, typecode, shapes):
+    keys_offset = HEADER.size
+    frequencies_offset = keys_offset + 8 * count
+    shapes_offset = frequencies_offset + 8 * count
+    file.write(HEADER.pack(MAGIC, VERSION, typecode.encode(), 1 if shapes else 0, count))
+    written = 0
+    keys = array.array(typecode)
+    frequencies = array.array('q')
+    shape_bytes = bytearray()
+    for value, frequency, depth, red in entries:
+        keys.append(value)
+        frequencies.append(frequency)
+        if shapes:
+            shape_bytes.append(depth << 1 | red)
+        if len(keys) == CHUNK_SIZE:
+            written = _write_chunk(file, keys, frequencies, shape_bytes, written, keys_offset, frequencies_offset, shapes_offset)
+    written = _write_chunk(file, keys, frequencies, shape_bytes, written, keys_offset, frequencies_offset, shapes_offset)
+    if written != count:
+        raise ValueError(f'Expected {count} keys but the tree has {written}')
+
+def _write_chunk(file, keys, frequencies, shape_bytes, written, keys_offset, frequencies_offset, shapes_offset):
+    if sys.byteorder == 'big':
+        keys.byteswap()
+        frequencies.byteswap()
+    file.seek(keys_offset + 8 * written)
+    keys.tofile(file)
+    file.seek(frequencies_offset + 8 * written)
+    frequencies.tofile(file)
+    if shape_bytes:
+        file.seek(shapes_offset + written)
+        file.write(shape_bytes)
+    written += len(keys)
+    del keys[:]
+    del frequencies[:]
+    del shape_bytes[:]
+    return written
+
+# We call build(keys, frequencies, shapes) while the file is mapped, where shapes is None if the snapshot has no shape section
+# The garbage collector is paused while the nodes are created, because every collection would walk all the nodes created so far
+def load(path, build):
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load(path, build)
+    finally:
+        if enabled:
+            gc.enable()
+
+def _load(path, build):
+    with open(path, 'rb') as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f'{path} is not a tree snapshot')
+        magic, version, typecode, has_shapes, count = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a tree snapshot')
+        typecode = typecode.decode()
+        if count == 0:
+            return build([], [], [] if has_shapes else None)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                keys_end = HEADER.size + 8 * count
+                frequencies_end = keys_end + 8 * count
+                with view[HEADER.size:keys_end].cast(typecode) as keys, view[keys_end:frequencies_end].cast('q') as frequencies, view[frequencies_end:frequencies_end + count] as shapes:
+                    if sys.byteorder == 'big':
+                        keys = array.array(typecode, keys)
+                        keys.byteswap()
+                        frequencies = array.array('q', frequencies)
+                        frequencies.byteswap()
+                    return build(keys, frequencies, shapes if has_shapes else None)
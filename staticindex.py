@@ -0,0 +1,288 @@
+# ###### Introduction ######
+#
+# This file contains a static index, which is a search tree that can be searched but never changed
+#
+# Many indexes are built once and then searched for hours, and for those we don't need nodes and pointers at all
+#
+# We call freeze() on a BinarySearchTree or a RedBlackTree, and it copies the keys and their frequencies into two flat arrays
+#
+# An array of 64-bit integers or floats takes 8 bytes per key, while a Node object takes well over 100 bytes
+#
+# The keys can be laid out in one of two ways
+#
+# 1. The sorted layout keeps the keys in increasing order, and we search it with a binary search (the bisect module)
+# 2. The Eytzinger layout keeps the keys in the order of a breadth-first traversal of a complete binary tree, like a binary heap
+#
+# In the Eytzinger layout the root is at index 1, and the children of index i are at 2i and 2i + 1
+#
+# The first few levels of the tree sit next to each other in memory, so the first steps of every search hit the same cache lines
+#
+# The search has no branches that depend on the key, because we step to 2i + (keys[i] < key) at every level
+#
+# When we fall off the bottom of the tree, the last time we went left is the smallest key that is greater than or equal to the search key, and we find it by stripping the trailing 1 bits of i
+#
+# If NumPy is installed, use_numpy=True wraps the key array in a NumPy array (without copying it), and search_many() searches the whole batch at once
+#
+# In pure Python the sorted layout is the faster one for single searches, because bisect runs in C while the Eytzinger loop runs in the interpreter
+#
+# The Eytzinger layout pays off in search_many() with NumPy, where every level of the tree is one vectorized step over the whole batch
+#
+# ###### Examples ######
+#
+# Example 1: Freeze a red-black tree of one million random keys and compare the search time with the tree
+#
+# % python staticindex.py -r -s 1e6 -max 1e9 -l eytzinger
+#
+# Example 2: The same thing in Python
+#
+# >>> index = redblacktree.RedBlackTree(arr).freeze()
+# >>> index.search(42)
+# >>> list(index.range(10, 20))
+
+import array
+import bisect
+import random
+import sys
+import time
+import argparse
+import dataio
+import snapshot
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class StaticIndex:
+    # The keys must be distinct and in increasing order, and frequencies[i] is the number of times keys[i] occurs
+    def __init__(self, keys, frequencies, layout='sorted', use_numpy=False):
+        if layout not in ('sorted', 'eytzinger'):
+            raise ValueError(f'Unknown layout {layout}')
+        if use_numpy and numpy is None:
+            raise ImportError('use_numpy=True requires NumPy')
+        keys = list(keys)
+        frequencies = list(frequencies)
+        self.layout = layout
+        self.use_numpy = use_numpy
+        self.n = len(keys)
+        self.value_count = sum(frequencies)
+        if layout == 'eytzinger':
+            keys, frequencies = self.eytzinger(keys), self.eytzinger(frequencies)
+        self.keys = self.storage(keys)
+        self.frequencies = self.storage(frequencies, 'q')
+        # The NumPy arrays share their memory with the typed arrays, so the batch searches cost no extra memory
+        if use_numpy:
+            if not isinstance(self.keys, array.array):
+                raise ValueError('use_numpy=True requires keys that are all integers or all floats')
+            self.numpy_keys = numpy.frombuffer(self.keys, dtype=numpy.int64 if self.keys.typecode == 'q' else numpy.float64)
+
+    # Index 0 of the Eytzinger layout is never used, so we fill it with a copy of the first key to keep the array homogeneous
+    def eytzinger(self, values):
+        if not values:
+            return [0]
+        out = [values[0]] * (self.n + 1)
+        i = self.first()
+        for value in values:
+            out[i] = value
+            i = self.next(i)
+        return out
+
+    # Integer and float keys go into a typed array, and any other keys stay in a list
+    # We check every key, so a mix of integers and floats also stays in a list instead of turning the integers into floats
+    def storage(self, values, typecode=None):
+        if typecode is None:
+            try:
+                typecode = snapshot.keys_typecode(values)
+            except ValueError:
+                return values
+        try:
+            return array.array(typecode, values)
+        except (TypeError, OverflowError):
+            return values
+
+    # We return the position of the first key that is greater than or equal to the value, or None if every key is smaller
+    def lower_bound(self, value):
+        keys, n = self.keys, self.n
+        if self.layout == 'sorted':
+            i = bisect.bisect_left(keys, value)
+            return i if i < n else None
+        i = 1
+        while i <= n:
+            i = 2 * i + (keys[i] < value)
+        i >>= (i ^ (i + 1)).bit_length()
+        return i or None
+
+    # We return the position of the smallest key, in the order of the layout
+    def first(self):
+        if self.layout == 'sorted':
+            return 0 if self.n else None
+        i = 1
+        while 2 * i <= self.n:
+            i *= 2
+        return i if self.n else None
+
+    # We return the position of the next key in increasing order, or None after the largest key
+    def next(self, i):
+        n = self.n
+        if self.layout == 'sorted':
+            i += 1
+            return i if i < n else None
+        if 2 * i + 1 <= n:
+            i = 2 * i + 1
+            while 2 * i <= n:
+                i *= 2
+            return i
+        while i & 1:
+            i >>= 1
+        i >>= 1
+        return i or None
+
+    # We return the number of times the value occurs
+    def frequency(self, value):
+        i = self.lower_bound(value)
+        if i is None or self.keys[i] != value:
+            return 0
+        return int(self.frequencies[i])
+
+    def search(self, value):
+        return self.frequency(value) > 0
+
+    def __contains__(self, value):
+        return self.frequency(value) > 0
+
+    # We return what search() would return for each value, in the order of the values
+    # NumPy compares the probes as the type of the keys, so a float probe like 2.5 would be truncated to 2 against integer keys
+    # We only search the whole numbers among float probes, and leave probes that NumPy can't compare exactly (like huge integers) to the Python loop
+    def search_many(self, values):
+        if self.use_numpy and self.n:
+            probes = numpy.asarray(values)
+            kind = probes.dtype.kind
+            if kind == 'f' and self.numpy_keys.dtype == numpy.int64:
+                whole = numpy.isfinite(probes) & (probes == numpy.trunc(probes)) & (probes >= -2.0 ** 63) & (probes < 2.0 ** 63)
+                found = numpy.zeros(len(probes), dtype=bool)
+                found[whole] = self._search_many_numpy(probes[whole].astype(numpy.int64))
+                return found.tolist()
+            if kind == 'i' or kind == 'f':
+                return self._search_many_numpy(probes.astype(self.numpy_keys.dtype)).tolist()
+        keys, n = self.keys, self.n
+        if self.layout == 'sorted':
+            bisect_left = bisect.bisect_left
+            result = []
+            for value in values:
+                i = bisect_left(keys, value)
+                result.append(i < n and keys[i] == value)
+            return result
+        return [self.frequency(value) > 0 for value in values]
+
+    # Every probe descends one level of the tree per pass, so the whole batch takes about log2(n) vectorized steps
+    def _search_many_numpy(self, values):
+        keys, n = self.numpy_keys, self.n
+        if self.layout == 'sorted':
+            positions = numpy.searchsorted(keys, values)
+            found = positions < n
+            found[found] = keys[positions[found]] == values[found]
+            return found
+        positions = numpy.ones(len(values), dtype=numpy.int64)
+        for _ in range(n.bit_length()):
+            inside = positions <= n
+            step = keys[numpy.where(inside, positions, 1)] < values
+            positions = numpy.where(inside, 2 * positions + step, positions)
+        # We strip the trailing 1 bits and one more bit, like lower_bound()
+        lowest_zero = ~positions & (positions + 1)
+        positions >>= numpy.log2(lowest_zero).astype(numpy.int64) + 1
+        found = positions > 0
+        found[found] = keys[positions[found]] == values[found]
+        return found
+
+    # We yield (value, frequency) pairs in increasing order, starting with the first value greater than or equal to the given value
+    def items_from(self, value):
+        keys, frequencies = self.keys, self.frequencies
+        i = self.lower_bound(value)
+        while i is not None:
+            yield (keys[i], int(frequencies[i]))
+            i = self.next(i)
+
+    # We yield the values v such that lo <= v <= hi in increasing order, repeating each value as many times as it occurs
+    def range(self, lo, hi):
+        for value, frequency in self.items_from(lo):
+            if value > hi:
+                return
+            for _ in range(frequency):
+                yield value
+
+    def to_list(self):
+        arr = []
+        i = self.first()
+        while i is not None:
+            arr.extend([self.keys[i]] * int(self.frequencies[i]))
+            i = self.next(i)
+        return arr
+
+    def size(self):
+        return (self.n, self.value_count)
+
+    def __len__(self):
+        return self.value_count
+
+    def memory_usage(self):
+        if isinstance(self.keys, list):
+            keys = sys.getsizeof(self.keys) + sum(sys.getsizeof(key) for key in self.keys)
+        else:
+            keys = sys.getsizeof(self.keys)
+        return keys + sys.getsizeof(self.frequencies)
+
+if __name__ == '__main__':
+    # bst.py and redblacktree.py import this file for freeze(), so only the command line imports them back
+    import redblacktree
+    import compactredblacktree
+    parser = argparse.ArgumentParser(prog='staticindex.py', description='Static search index')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-i', '--inputfile', type=str)
+    group.add_argument('-n', '--numbers', nargs='+', type=int)
+    group.add_argument('-r', '--random', action='store_true')
+    parser.add_argument('-s', '--size', type=float, default=10)
+    parser.add_argument('-min', '--minimum', type=float, default=0)
+    parser.add_argument('-max', '--maximum', type=float, default=100)
+    parser.add_argument('--format', choices=dataio.FORMATS)
+    parser.add_argument('-l', '--layout', choices=['sorted', 'eytzinger'], default='sorted')
+    parser.add_argument('--numpy', action='store_true')
+    parser.add_argument('-p', '--probes', type=float, default=1e5)
+    args = parser.parse_args()
+    if args.inputfile:
+        arr = dataio.read(args.inputfile, args.format)
+    elif args.numbers:
+        arr = args.numbers
+    elif args.random:
+        size, min, max = int(args.size), int(args.minimum), int(args.maximum)
+        arr = [random.randint(min, max) for i in range(size)]
+    tree = redblacktree.RedBlackTree(arr)
+    index = tree.freeze(args.layout, args.numpy)
+    node_count, value_count = index.size()
+    probes = [random.choice(arr) if i % 2 else random.randint(int(args.minimum), int(args.maximum)) for i in range(int(args.probes))]
+    print('Statistics')
+    print('------------------------------')
+    print(f'Layout: {args.layout} Node count: {node_count} Value count: {value_count}')
+    print('')
+    print('Memory usage')
+    print('------------------------------')
+    tree_memory = compactredblacktree.object_memory_usage(tree)
+    index_memory = index.memory_usage()
+    print(f'Red-black tree: {tree_memory} bytes ({tree_memory / (node_count or 1):.1f} bytes per key)')
+    print(f'Static index: {index_memory} bytes ({index_memory / (node_count or 1):.1f} bytes per key)')
+    print('')
+    print('Search time')
+    print('------------------------------')
+    start_time = time.perf_counter_ns()
+    for probe in probes:
+        tree.search(probe)
+    tree_time = (time.perf_counter_ns() - start_time) / len(probes)
+    start_time = time.perf_counter_ns()
+    for probe in probes:
+        index.search(probe)
+    index_time = (time.perf_counter_ns() - start_time) / len(probes)
+    start_time = time.perf_counter_ns()
+    index.search_many(probes)
+    batch_time = (time.perf_counter_ns() - start_time) / len(probes)
+    print(f'Red-black tree search: {tree_time:.1f} ns per key')
+    print(f'Static index search: {index_time:.1f} ns per key')
+    print(f'Static index search_many: {batch_time:.1f} ns per key')
@@ -0,0 +1,86 @@
+# ###### Introduction ######
+#
+# This file indexes a table of records with a binary search tree or a red-black tree
+#
+# The indexed columns become the key, and the key of a record is the tuple of its values in those columns
+#
+# Tuples are compared column by column, so an index over (last name, first name) orders the records by last name and then by first name
+#
+# The records themselves are stored in the nodes of the tree, and records that share a key are chained together in the same node
+#
+# So a lookup or a range scan returns references to the records, and we don't need to keep a separate dictionary of records beside the tree
+#
+# ###### Examples ######
+#
+# Example 1: Index a CSV file by its last_name and first_name columns, and look up a customer
+#
+# % python tableindex.py -f customers.csv -c last_name first_name -k Smith John
+#
+# Example 2: Index a CSV file by its zip column, and print the records with a zip code between 10000 and 19999
+#
+# % python tableindex.py -f customers.csv -c zip -R 10000 19999
+#
+# Example 3: The same thing in Python
+#
+# >>> index = TableIndex(rows, ['last_name', 'first_name'])
+# >>> index.lookup('Smith', 'John')
+# >>> list(index.range(('A',), ('B',)))
+
+import csv
+import argparse
+import bst
+import redblacktree
+
+class TableIndex:
+    # The rows can be dictionaries, lists or tuples, as long as row[column] returns the value of a column
+    def __init__(self, rows=None, columns=(0,), tree=redblacktree.RedBlackTree):
+        self.columns = tuple(columns)
+        self.tree = tree()
+        if rows:
+            self.tree.load_records([(self.key(row), row) for row in rows])
+
+    def key(self, row):
+        return tuple(row[column] for column in self.columns)
+
+    def insert(self, row):
+        self.tree.insert(self.key(row), row)
+
+    # We remove this exact row, so other rows with the same key stay in the index
+    def delete(self, row):
+        return self.tree.delete_record(self.key(row), row)
+
+    # We return the records whose indexed columns are equal to the given values
+    def lookup(self, *key):
+        return self.tree.records(tuple(key))
+
+    # We yield the records whose keys k satisfy lo <= k <= hi, in the order of their keys
+    # A shorter tuple sorts before every key that starts with it, so range(('Smith',), ('Smith', chr(0x10ffff))) yields every Smith
+    def range(self, lo, hi):
+        for node in self.tree.range_nodes(tuple(lo), tuple(hi)):
+            if node.records is not None:
+                yield from node.records
+
+    def __len__(self):
+        root = self.tree.root
+        return root.value_count if root is not None else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='tableindex.py', description='Index a CSV file by one or more columns')
+    parser.add_argument('-f', '--file', type=str, required=True)
+    parser.add_argument('-c', '--columns', nargs='+', required=True)
+    parser.add_argument('-t', '--tree', choices=['bst', 'rbt'], default='rbt')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-k', '--key', nargs='+')
+    group.add_argument('-R', '--range', nargs=2)
+    args = parser.parse_args()
+    with open(args.file, newline='') as file:
+        rows = list(csv.DictReader(file))
+    tree = bst.BinarySearchTree if args.tree == 'bst' else redblacktree.RedBlackTree
+    index = TableIndex(rows, args.columns, tree)
+    if args.key:
+        records = index.lookup(*args.key)
+    else:
+        lo, hi = args.range
+        records = index.range((lo,), (hi, chr(0x10ffff)))
+    for record in records:
+        print(record)
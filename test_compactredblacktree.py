@@ -0,0 +1,20 @@
+import pytest
+from compactredblacktree import CompactRedBlackTree
+
+@pytest.mark.parametrize('value, error', [(2 ** 70, OverflowError), (2.5, TypeError)])
+def test_failed_insert_leaves_tree_unchanged(value, error):
+    tree = CompactRedBlackTree([1, 2, 3])
+    with pytest.raises(error):
+        tree.insert(value)
+    assert tree.size() == (3, 3)
+    assert tree.to_list() == [1, 2, 3]
+
+def test_failed_insert_keeps_free_list():
+    tree = CompactRedBlackTree([1, 2, 3])
+    tree.delete(2)
+    with pytest.raises(TypeError):
+        tree.insert(2.5)
+    tree.insert(4)
+    tree.insert(5)
+    assert tree.size() == (4, 4)
+    assert tree.to_list() == [1, 3, 4, 5]
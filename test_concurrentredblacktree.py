@@ -0,0 +1,44 @@
+import random
+import concurrentredblacktree
+from concurrentredblacktree import ConcurrentRedBlackTree
+
+# We return the black height of the subtree, and fail if a red node has a red child or two paths have different black heights
+def check_invariants(node):
+    if node is None:
+        return 0
+    if node.color == 'red':
+        assert not concurrentredblacktree.is_red(node.left) and not concurrentredblacktree.is_red(node.right)
+    left_height = check_invariants(node.left)
+    right_height = check_invariants(node.right)
+    assert left_height == right_height
+    height = left_height + (1 if node.color == 'black' else 0)
+    assert node.height == height
+    return height
+
+def check_tree(tree, expected):
+    root = tree.snapshot().root
+    assert not concurrentredblacktree.is_red(root)
+    check_invariants(root)
+    assert tree.to_list() == sorted(expected)
+
+def test_apply_small_batch():
+    tree = ConcurrentRedBlackTree()
+    tree.apply([31, 23, 4])
+    check_tree(tree, [31, 23, 4])
+
+def test_apply_sorted_batch():
+    tree = ConcurrentRedBlackTree()
+    tree.apply(list(range(1000)))
+    check_tree(tree, list(range(1000)))
+    assert tree.height() <= 20
+
+def test_apply_random_batches():
+    random.seed(11)
+    for _ in range(200):
+        arr = [random.randrange(50) for _ in range(random.randrange(30))]
+        tree = ConcurrentRedBlackTree(arr)
+        insertions = [random.randrange(50) for _ in range(random.randrange(30))]
+        deletions = [random.randrange(50) for _ in range(random.randrange(10))]
+        tree.apply(insertions, deletions)
+        expected = [value for value in arr + insertions if value not in deletions]
+        check_tree(tree, expected)